@@ -1,15 +1,34 @@
+import numpy as np
 from fastapi import FastAPI
 from pydantic import BaseModel
+from .trajectory import score_batch
+from .nlp import classify
 
 app = FastAPI(title="AI Service")
 
 class TrajectoryRequest(BaseModel):
     speeds: list[float] = []
     gaps: list[float] = []
+    # Optional, aligned with speeds; used by the batch scorer
+    timestamps: list[float] | None = None
+    lats: list[float] | None = None
+    lngs: list[float] | None = None
 
 class TrajectoryResponse(BaseModel):
     anomaly_score: float
 
+class TrajectoryBatchRequest(BaseModel):
+    trajectories: list[TrajectoryRequest]
+
+class TrajectoryScore(BaseModel):
+    anomaly_score: float
+    max_speed_z: float
+    longest_stop: float
+    heading_change: float
+
+class TrajectoryBatchResponse(BaseModel):
+    scores: list[TrajectoryScore]
+
 class NLPRequest(BaseModel):
     text: str
     language: str | None = None
@@ -17,6 +36,13 @@ class NLPRequest(BaseModel):
 class NLPResponse(BaseModel):
     label: str
     confidence: float
+    keywords: list[str] = []
+
+class NLPBatchRequest(BaseModel):
+    items: list[NLPRequest]
+
+class NLPBatchResponse(BaseModel):
+    results: list[NLPResponse]
 
 @app.get("/healthz")
 async def healthz():
@@ -25,13 +51,20 @@ async def healthz():
 @app.post("/anomaly/trajectory-score", response_model=TrajectoryResponse)
 async def trajectory_score(req: TrajectoryRequest):
     # Dummy scoring: std of speeds + avg gap as proxy
-    import numpy as np
     score = float(np.std(req.speeds or [0.0]) + np.mean(req.gaps or [0.0]))
     return {"anomaly_score": min(score, 1.0)}
 
+@app.post("/anomaly/trajectory-score/batch", response_model=TrajectoryBatchResponse)
+async def trajectory_score_batch(req: TrajectoryBatchRequest):
+    # All trajectories are packed into contiguous arrays and scored in one vectorised pass
+    feats = score_batch(req.trajectories)
+    keys = list(feats)
+    return {"scores": [dict(zip(keys, row)) for row in zip(*(feats[k].tolist() for k in keys))]}
+
 @app.post("/nlp/classify", response_model=NLPResponse)
 async def nlp_classify(req: NLPRequest):
-    text = (req.text or "").lower()
-    if any(k in text for k in ["help", "sos", "panic", "attack", "harass", "hospital", "lost"]):
-        return {"label": "emergency", "confidence": 0.85}
-    return {"label": "other", "confidence": 0.6}
+    return classify(req.text, req.language)
+
+@app.post("/nlp/classify/batch", response_model=NLPBatchResponse)
+async def nlp_classify_batch(req: NLPBatchRequest):
+    return {"results": [classify(item.text, item.language) for item in req.items]}
@@ -0,0 +1,126 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+# Per-language keyword -> weight (probability the keyword alone means an emergency).
+# Override with a JSON file of the same shape via NLP_KEYWORDS_PATH.
+DEFAULT_KEYWORDS: dict[str, dict[str, float]] = {
+    "en": {
+        "help": 0.85, "sos": 0.85, "panic": 0.85, "attack": 0.85, "harass": 0.85, "hospital": 0.85, "lost": 0.85,
+        "emergency": 0.9, "injured": 0.85, "bleeding": 0.9, "robbed": 0.85, "kidnap": 0.95, "ambulance": 0.85,
+        "accident": 0.8, "fire": 0.7, "police": 0.45, "stolen": 0.45, "unsafe": 0.45, "scared": 0.4,
+        # Keywords match whole words only, so common inflections are listed explicitly
+        "attacked": 0.85, "harassed": 0.85, "kidnapped": 0.95, "robbery": 0.85,
+    },
+    "hi": {
+        "बचाओ": 0.9, "मदद": 0.85, "खतरा": 0.8, "चोट": 0.8, "अस्पताल": 0.8, "एम्बुलेंस": 0.85, "पुलिस": 0.45,
+        "चोरी": 0.7, "आग": 0.7, "bachao": 0.9, "madad": 0.85, "khatra": 0.8,
+    },
+    "es": {
+        "ayuda": 0.85, "socorro": 0.9, "emergencia": 0.9, "auxilio": 0.9, "herido": 0.85, "robo": 0.7,
+        "hospital": 0.85, "policía": 0.45, "perdido": 0.8, "ambulancia": 0.85,
+    },
+    "fr": {
+        "au secours": 0.9, "aidez-moi": 0.9, "urgence": 0.9, "blessé": 0.85, "agression": 0.85, "vol": 0.4,
+        "hôpital": 0.85, "police": 0.45, "perdu": 0.8, "ambulance": 0.85,
+    },
+}
+
+# Combined confidence at or above which a message is labelled an emergency
+EMERGENCY_THRESHOLD = 0.5
+# Confidence reported for messages with no keyword at all
+NO_MATCH_CONFIDENCE = 0.6
+
+
+def _trie_pattern(words) -> str:
+    # Factor shared prefixes so matching costs depend on the text length, not on the number of keywords
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        end = "" in node
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if end:
+            # Greedy optional part: prefer the longer keyword when one is a prefix of another
+            return "(?:" + body + ")?" if len(alts) == 1 else body + "?"
+        return body
+
+    return emit(trie)
+
+
+def _is_latin(word: str) -> bool:
+    return all(ord(ch) < 0x250 for ch in word if ch.isalpha())
+
+
+def _keywords_pattern(words) -> str:
+    # Latin-script keywords must be whole words ("fire" not in "fireworks", "robo" not in "robots");
+    # other scripts keep substring matching, since their inflections attach to the stem
+    latin = [w for w in words if _is_latin(w)]
+    other = [w for w in words if not _is_latin(w)]
+    parts = []
+    if latin:
+        parts.append(r"(?<!\w)(?:" + _trie_pattern(latin) + r")(?!\w)")
+    if other:
+        parts.append("(?:" + _trie_pattern(other) + ")")
+    return "|".join(parts)
+
+
+class KeywordMatcher:
+    def __init__(self, weights: dict[str, float]):
+        self.weights = {k.casefold(): float(w) for k, w in weights.items() if k}
+        self.pattern = re.compile(_keywords_pattern(self.weights)) if self.weights else None
+
+    def classify(self, text: str) -> dict:
+        found = sorted({m.group(0) for m in self.pattern.finditer(text.casefold())}) if self.pattern and text else []
+        if not found:
+            return {"label": "other", "confidence": NO_MATCH_CONFIDENCE, "keywords": []}
+        # Independent-evidence combination: 1 - prod(1 - w)
+        miss = 1.0
+        for k in found:
+            miss *= 1.0 - self.weights[k]
+        confidence = 1.0 - miss
+        if confidence >= EMERGENCY_THRESHOLD:
+            return {"label": "emergency", "confidence": round(confidence, 4), "keywords": found}
+        return {"label": "other", "confidence": round(1.0 - confidence, 4), "keywords": found}
+
+
+def load_keywords() -> dict[str, dict[str, float]]:
+    path = os.getenv("NLP_KEYWORDS_PATH")
+    if not path:
+        return DEFAULT_KEYWORDS
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+KEYWORDS = load_keywords()
+
+
+def _normalise_language(language: str | None) -> str | None:
+    if not language:
+        return None
+    lang = language.split("-")[0].split("_")[0].lower()
+    return lang if lang in KEYWORDS else None
+
+
+@lru_cache(maxsize=None)
+def matcher_for(language: str | None) -> KeywordMatcher:
+    # Known language: its own table plus English (SOS messages often mix in English words).
+    # Unknown or missing language: every table.
+    langs = [language, "en"] if language else list(KEYWORDS)
+    weights: dict[str, float] = {}
+    for lang in langs:
+        for k, w in KEYWORDS.get(lang, {}).items():
+            weights[k] = max(w, weights.get(k, 0.0))
+    return KeywordMatcher(weights)
+
+
+def classify(text: str, language: str | None = None) -> dict:
+    return matcher_for(_normalise_language(language)).classify(text or "")
@@ -0,0 +1,102 @@
+from itertools import chain
+
+import numpy as np
+
+# Trailing window (samples) for rolling speed statistics
+WINDOW = 5
+# Lower bound on the rolling speed std (m/s) so steady walking doesn't turn small changes into huge z-scores
+SPEED_STD_FLOOR = 0.5
+# Below this speed (m/s) a sample counts as stopped
+STOP_SPEED = 0.5
+# Feature values at which each score component saturates
+Z_CAP = 4.0
+STOP_CAP = 1800.0  # seconds
+# Component weights: speed z-score, longest stop, heading change
+WEIGHTS = np.array([0.5, 0.3, 0.2])
+
+
+def _pack_optional(trajs, attr: str, lengths: np.ndarray, total: int) -> np.ndarray:
+    # Values aligned with speeds, NaN where a trajectory doesn't carry this array (or its length doesn't match)
+    parts = (
+        vals if vals is not None and len(vals) == n else (np.nan,) * n
+        for vals, n in ((getattr(t, attr), int(n)) for t, n in zip(trajs, lengths))
+    )
+    return np.fromiter(chain.from_iterable(parts), dtype=np.float64, count=total)
+
+
+def _segment_max(values: np.ndarray, seg: np.ndarray, n: int) -> np.ndarray:
+    out = np.zeros(n)
+    np.maximum.at(out, seg, values)
+    return out
+
+
+def score_batch(trajs) -> dict[str, np.ndarray]:
+    """Score many ragged trajectories in one vectorised pass over contiguous buffers.
+
+    Each trajectory has `speeds` and optionally `gaps` (seconds since the previous sample),
+    `timestamps` (epoch seconds) and `lats`/`lngs`, all aligned sample by sample.
+    """
+    n = len(trajs)
+    lengths = np.fromiter((len(t.speeds) for t in trajs), dtype=np.int64, count=n)
+    total = int(lengths.sum())
+    if total == 0:
+        zeros = np.zeros(n)
+        return {"anomaly_score": zeros, "max_speed_z": zeros, "longest_stop": zeros, "heading_change": zeros}
+
+    speeds = np.fromiter(chain.from_iterable(t.speeds for t in trajs), dtype=np.float64, count=total)
+    seg = np.repeat(np.arange(n), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    pos = np.arange(total) - starts[seg]  # index of each sample within its trajectory
+    first = pos == 0
+
+    # Time step per sample: timestamp deltas, else supplied gaps, else nothing
+    ts = _pack_optional(trajs, "timestamps", lengths, total)
+    gaps = _pack_optional(trajs, "gaps", lengths, total)
+    dt = np.diff(ts, prepend=np.nan)
+    dt = np.where(np.isnan(dt), gaps, dt)
+    dt[first] = 0.0
+    dt = np.nan_to_num(np.clip(dt, 0.0, None))
+
+    # Rolling speed z-score against the previous WINDOW samples of the same trajectory
+    csum = np.concatenate(([0.0], np.cumsum(speeds)))
+    csq = np.concatenate(([0.0], np.cumsum(speeds * speeds)))
+    idx = np.arange(total)
+    lo = idx - np.minimum(pos, WINDOW)
+    count = idx - lo
+    has_window = count > 0
+    safe = np.maximum(count, 1)
+    mean = (csum[idx] - csum[lo]) / safe
+    var = np.maximum((csq[idx] - csq[lo]) / safe - mean * mean, 0.0)
+    std = np.maximum(np.sqrt(var), SPEED_STD_FLOOR)
+    z = np.where(has_window, (speeds - mean) / std, 0.0)
+    max_z = _segment_max(np.abs(z), seg, n)
+
+    # Longest continuous stop: runs of stopped samples, summed dt per run, max run per trajectory
+    stopped = speeds < STOP_SPEED
+    run_start = stopped & (first | ~np.roll(stopped, 1))
+    run_id = np.cumsum(run_start) - 1
+    longest_stop = np.zeros(n)
+    if stopped.any():
+        run_dur = np.bincount(run_id[stopped], weights=dt[stopped])
+        np.maximum.at(longest_stop, seg[run_start], run_dur)
+
+    # Mean absolute heading change between consecutive moves (needs coordinates)
+    lat = _pack_optional(trajs, "lats", lengths, total)
+    lng = _pack_optional(trajs, "lngs", lengths, total)
+    dlat = np.diff(lat, prepend=np.nan)
+    dlng = np.diff(lng, prepend=np.nan) * np.cos(np.radians(lat))
+    moved = ~first & ~np.isnan(dlat) & ~np.isnan(dlng) & ((dlat != 0) | (dlng != 0))
+    bearing = np.arctan2(dlng, dlat)
+    turn = np.abs((np.diff(bearing, prepend=np.nan) + np.pi) % (2 * np.pi) - np.pi)
+    valid = moved & np.roll(moved, 1) & (pos >= 2)
+    turns = np.bincount(seg[valid], weights=turn[valid], minlength=n)
+    turn_counts = np.bincount(seg[valid], minlength=n)
+    has_heading = turn_counts > 0
+    heading = np.divide(turns, turn_counts, out=np.zeros(n), where=has_heading)
+
+    # Weighted mean of saturated components; heading only counts where coordinates were supplied
+    comps = np.stack([np.minimum(max_z / Z_CAP, 1.0), np.minimum(longest_stop / STOP_CAP, 1.0), heading / np.pi], axis=1)
+    weights = np.broadcast_to(WEIGHTS, comps.shape) * np.stack([np.ones(n), np.ones(n), has_heading], axis=1)
+    score = (comps * weights).sum(axis=1) / weights.sum(axis=1)
+    score[lengths == 0] = 0.0
+    return {"anomaly_score": score, "max_speed_z": max_z, "longest_stop": longest_stop, "heading_change": heading}
@@ -10,5 +10,108 @@ class Settings(BaseModel):
     POLYGON_RPC_URL: str = os.getenv("POLYGON_RPC_URL", "https://rpc-amoy.polygon.technology")
     CONTRACT_ADDRESS: str = os.getenv("CONTRACT_ADDRESS", "")
     ALLOW_ORIGINS: str = os.getenv("ALLOW_ORIGINS", "*")
+    # In-process geofence index (STRtree); disable to fall back to PostGIS ST_Intersects per ping
+    GEOFENCE_INDEX_ENABLED: bool = os.getenv("GEOFENCE_INDEX_ENABLED", "1") == "1"
+    # How often a worker checks the shared geofence version to notice changes made by other workers
+    GEOFENCE_INDEX_REFRESH_SECONDS: float = float(os.getenv("GEOFENCE_INDEX_REFRESH_SECONDS", "5"))
+    # Upper bound on points accepted by /locations/ingest/batch
+    INGEST_BATCH_MAX: int = int(os.getenv("INGEST_BATCH_MAX", "5000"))
+    # Max (user_id, geofence_id) pairs held by the in-process breach dedup cache
+    ALERT_DEDUP_CACHE_SIZE: int = int(os.getenv("ALERT_DEDUP_CACHE_SIZE", "100000"))
+    # Write-behind location persistence: queue Location rows and insert them in batches off the request path
+    LOCATION_WRITE_BEHIND: bool = os.getenv("LOCATION_WRITE_BEHIND", "0") == "1"
+    LOCATION_QUEUE_SIZE: int = int(os.getenv("LOCATION_QUEUE_SIZE", "10000"))
+    LOCATION_BATCH_SIZE: int = int(os.getenv("LOCATION_BATCH_SIZE", "500"))
+    LOCATION_FLUSH_INTERVAL_MS: int = int(os.getenv("LOCATION_FLUSH_INTERVAL_MS", "200"))
+    # How long a request waits for queue space before the API answers 503
+    LOCATION_ENQUEUE_TIMEOUT_MS: int = int(os.getenv("LOCATION_ENQUEUE_TIMEOUT_MS", "1000"))
+    # CSV imports: rows per bulk insert/commit, and processes used for password hashing (0 = CPU count)
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+    IMPORT_HASH_WORKERS: int = int(os.getenv("IMPORT_HASH_WORKERS", "0"))
+    # Authenticated principal cache used by get_current_user
+    PRINCIPAL_CACHE_TTL: int = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+    # Put the user's role into issued JWTs so requests authorise without a user lookup.
+    # A role change only reaches other workers once their copy expires or the token does.
+    JWT_ROLE_CLAIM: bool = os.getenv("JWT_ROLE_CLAIM", "0") == "1"
+    # Role changes are remembered this long, so longer-lived tokens are always checked against the database
+    JWT_MAX_TOKEN_MINUTES: int = int(os.getenv("JWT_MAX_TOKEN_MINUTES", "1440"))
+    # Vector tiles: in-memory LRU size, plus an optional directory to keep tiles across restarts
+    TILE_CACHE_SIZE: int = int(os.getenv("TILE_CACHE_SIZE", "4096"))
+    TILE_CACHE_DIR: str = os.getenv("TILE_CACHE_DIR", "")
+    # Live alert stream: events kept for Last-Event-ID resume, and per-client buffer before events are dropped
+    LIVE_HISTORY_SIZE: int = int(os.getenv("LIVE_HISTORY_SIZE", "1000"))
+    LIVE_CLIENT_BUFFER: int = int(os.getenv("LIVE_CLIENT_BUFFER", "256"))
+    # Digital ID RPC: per-call timeout, pooled connections, and JSON-RPC calls per batch request
+    RPC_TIMEOUT_SECONDS: float = float(os.getenv("RPC_TIMEOUT_SECONDS", "5"))
+    RPC_POOL_SIZE: int = int(os.getenv("RPC_POOL_SIZE", "10"))
+    RPC_BATCH_SIZE: int = int(os.getenv("RPC_BATCH_SIZE", "100"))
+    # Upper bound on id hashes accepted by /digital-ids/verify/batch
+    DIGITAL_ID_BATCH_MAX: int = int(os.getenv("DIGITAL_ID_BATCH_MAX", "500"))
+    # Verification result cache; ids that are not registered are cached for the shorter negative TTL
+    DIGITAL_ID_CACHE_SIZE: int = int(os.getenv("DIGITAL_ID_CACHE_SIZE", "10000"))
+    DIGITAL_ID_CACHE_TTL: int = int(os.getenv("DIGITAL_ID_CACHE_TTL", "300"))
+    DIGITAL_ID_NEGATIVE_TTL: int = int(os.getenv("DIGITAL_ID_NEGATIVE_TTL", "30"))
+    # Location history: partition size ("day" or "week") and how many future partitions to keep ready
+    LOCATION_PARTITION_INTERVAL: str = os.getenv("LOCATION_PARTITION_INTERVAL", "day")
+    LOCATION_PARTITIONS_AHEAD: int = int(os.getenv("LOCATION_PARTITIONS_AHEAD", "3"))
+    # Keep raw pings this many days, then roll them up into daily tracks kept for this many months
+    LOCATION_RAW_RETENTION_DAYS: int = int(os.getenv("LOCATION_RAW_RETENTION_DAYS", "30"))
+    LOCATION_TRACK_RETENTION_MONTHS: int = int(os.getenv("LOCATION_TRACK_RETENTION_MONTHS", "12"))
+    # ST_Simplify tolerance (degrees) applied to rolled-up tracks; 0.0001 is roughly 10 m
+    LOCATION_TRACK_TOLERANCE: float = float(os.getenv("LOCATION_TRACK_TOLERANCE", "0.0001"))
+    # How often partition maintenance (create ahead, roll up, drop) runs; 0 disables it in this process
+    LOCATION_MAINTENANCE_INTERVAL_SECONDS: int = int(os.getenv("LOCATION_MAINTENANCE_INTERVAL_SECONDS", "3600"))
+    # /locations/{user_id}/track: default ST_Simplify tolerance (degrees), and hours of raw pings simplified per query
+    TRACK_DEFAULT_TOLERANCE: float = float(os.getenv("TRACK_DEFAULT_TOLERANCE", "0.00005"))
+    TRACK_CHUNK_HOURS: int = int(os.getenv("TRACK_CHUNK_HOURS", "6"))
+    # /metrics endpoint with request and SQL instrumentation
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "1") == "1"
+    # Log statements slower than this (with the route that issued them); 0 disables the slow-query log
+    SLOW_QUERY_MS: int = int(os.getenv("SLOW_QUERY_MS", "0"))
+    # Connection pools (applied to the sync and the async engine each) and a server-side statement timeout (0 = none)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+    # /geofences/nearby bounds, and the radius/limit/minimum risk used for ingest proximity warnings (?warn=true)
+    NEARBY_MAX_RADIUS_M: float = float(os.getenv("NEARBY_MAX_RADIUS_M", "10000"))
+    NEARBY_MAX_LIMIT: int = int(os.getenv("NEARBY_MAX_LIMIT", "50"))
+    PROXIMITY_WARN_RADIUS_M: float = float(os.getenv("PROXIMITY_WARN_RADIUS_M", "200"))
+    PROXIMITY_WARN_LIMIT: int = int(os.getenv("PROXIMITY_WARN_LIMIT", "3"))
+    PROXIMITY_WARN_MIN_RISK: str = os.getenv("PROXIMITY_WARN_MIN_RISK", "medium")
+    # Per-user geofence occupancy: "memory" (per-process LRU of OCCUPANCY_CACHE_SIZE users) or "redis" (REDIS_URL, shared)
+    OCCUPANCY_BACKEND: str = os.getenv("OCCUPANCY_BACKEND", "memory")
+    OCCUPANCY_CACHE_SIZE: int = int(os.getenv("OCCUPANCY_CACHE_SIZE", "100000"))
+    OCCUPANCY_TTL_SECONDS: int = int(os.getenv("OCCUPANCY_TTL_SECONDS", "86400"))
+    # Background job progress (imports, backfills): "memory" is visible only to the worker running
+    # the job, so run a single API worker or use "redis" (REDIS_URL) to poll and cancel from any worker
+    JOB_BACKEND: str = os.getenv("JOB_BACKEND", "memory")
+    JOB_SYNC_SECONDS: float = float(os.getenv("JOB_SYNC_SECONDS", "1"))
+    JOB_TTL_SECONDS: int = int(os.getenv("JOB_TTL_SECONDS", "86400"))
+    # Schema at startup: "auto" applies pending migrations (python -m app.migrate), "check" refuses to start while any are pending, "skip" trusts the release step
+    STARTUP_SCHEMA: str = os.getenv("STARTUP_SCHEMA", "auto")
+    # Warm spatial caches before serving: the geofence index plus /geofences/geojson for these zooms ("full" = unsimplified); 0 leaves it to the first request
+    STARTUP_WARMUP: bool = os.getenv("STARTUP_WARMUP", "1") == "1"
+    GEOJSON_WARMUP_ZOOMS: str = os.getenv("GEOJSON_WARMUP_ZOOMS", "")
+    # Maximum vertices per geofence_pieces row (ST_Subdivide); smaller pieces mean cheaper point tests but more rows
+    GEOFENCE_SUBDIVIDE_MAX_VERTICES: int = int(os.getenv("GEOFENCE_SUBDIVIDE_MAX_VERTICES", "64"))
+    # Upper bound on ids accepted by /alerts/bulk/acknowledge and /alerts/bulk/resolve
+    ALERT_BULK_MAX_IDS: int = int(os.getenv("ALERT_BULK_MAX_IDS", "5000"))
+    # Auto-resolve open alerts older than this many hours (0 disables the sweeper), checked every interval, batch rows per transaction
+    ALERT_AUTO_RESOLVE_HOURS: float = float(os.getenv("ALERT_AUTO_RESOLVE_HOURS", "0"))
+    ALERT_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("ALERT_SWEEP_INTERVAL_SECONDS", "300"))
+    ALERT_SWEEP_BATCH: int = int(os.getenv("ALERT_SWEEP_BATCH", "500"))
+    # Retroactive alerts for new geofences: hours of location history checked on create/import (0 = only on request), minutes per chunk
+    GEOFENCE_BACKFILL_HOURS: float = float(os.getenv("GEOFENCE_BACKFILL_HOURS", "6"))
+    GEOFENCE_BACKFILL_MAX_HOURS: float = float(os.getenv("GEOFENCE_BACKFILL_MAX_HOURS", "72"))
+    GEOFENCE_BACKFILL_CHUNK_MINUTES: int = int(os.getenv("GEOFENCE_BACKFILL_CHUNK_MINUTES", "30"))
+    # /analytics/heatmap: grid levels counted (cell = 360/2**level degrees; 10, 13, 16 are roughly 39 km, 4.9 km, 610 m),
+    # how often each worker merges its pending counts, and per-request bounds
+    HEATMAP_ENABLED: bool = os.getenv("HEATMAP_ENABLED", "1") == "1"
+    HEATMAP_LEVELS: str = os.getenv("HEATMAP_LEVELS", "10,13,16")
+    HEATMAP_FLUSH_SECONDS: float = float(os.getenv("HEATMAP_FLUSH_SECONDS", "5"))
+    HEATMAP_MAX_CELLS: int = int(os.getenv("HEATMAP_MAX_CELLS", "20000"))
+    HEATMAP_MAX_RANGE_DAYS: int = int(os.getenv("HEATMAP_MAX_RANGE_DAYS", "92"))
 
 settings = Settings()
@@ -1,12 +1,63 @@
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from geoalchemy2 import load_spatialite  # not used but keeps GeoAlchemy import order
 from .core.config import settings
+from .services.metrics import POOL_CHECKOUT_WAIT
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+class _CheckoutTimer:
+    # Records how long each checkout waits for a connection (db_pool_checkout_wait_seconds)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, (self.metrics_label,))
+
+class InstrumentedQueuePool(_CheckoutTimer, QueuePool):
+    metrics_label = "sync"
+
+class InstrumentedAsyncQueuePool(_CheckoutTimer, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+def _pool_args() -> dict:
+    args = {
+        "pool_pre_ping": True,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        # Server-side cap on every statement, so a stuck query frees its connection
+        args["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return args
+
+def async_database_url(url: str) -> str:
+    # Same database through psycopg 3's asyncio support (postgresql:// and postgresql+psycopg2:// map to it)
+    u = make_url(url)
+    if u.drivername in ("postgresql", "postgres", "postgresql+psycopg2"):
+        u = u.set(drivername="postgresql+psycopg")
+    return u.render_as_string(hide_password=False)
+
+engine = create_engine(settings.DATABASE_URL, poolclass=InstrumentedQueuePool, **_pool_args())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for the hot routes: waiting on the database doesn't hold a threadpool thread
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL), poolclass=InstrumentedAsyncQueuePool, **_pool_args()
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def ensure_indexes(bind=None):
+    # create_all() skips indexes on tables that already exist; add any declared since
+    for table in Base.metadata.sorted_tables:
+        for ix in table.indexes:
+            ix.create(bind=bind if bind is not None else engine, checkfirst=True)
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -14,3 +65,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,36 +1,129 @@
-from fastapi import Depends, HTTPException, status
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
 from .core.config import settings
-from .db import get_db
+from .db import AsyncSessionLocal
 from . import models
+from .security import ACCESS_MIN
+from .services.cache import TTLCache
 
 # HTTP Bearer for paste-token flow in Swagger Authorize
 bearer_scheme = HTTPBearer(auto_error=True)
+# Streams opened by browser EventSource, which cannot send headers, may pass ?access_token= instead
+optional_bearer = HTTPBearer(auto_error=False)
 ALGO = "HS256"
 
-async def get_current_user(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme), db: Session = Depends(get_db)) -> models.User:
-    credentials_exception = HTTPException(
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    role: models.Role
+
+# token -> (Principal, cached_at). Entries never outlive the token itself.
+principal_cache = TTLCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
+class Invalidations:
+    """user_id -> time of the last role change/deletion; older cache entries and role claims are not trusted.
+
+    A mark is kept as long as a token issued before it can still be valid (retention). Live marks
+    are never lost: past maxsize the oldest is dropped and its time becomes a floor for every
+    user, so everything cached or claimed before it goes back to the database instead.
+    """
+
+    def __init__(self, maxsize: int, retention: float):
+        self.maxsize = maxsize
+        self.retention = retention
+        self._marks: OrderedDict[int, float] = OrderedDict()
+        self._floor = 0.0
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._marks.pop(user_id, None)
+            self._marks[user_id] = now
+            # Oldest first: expired marks can go, no token they guard is still valid
+            while self._marks and next(iter(self._marks.values())) <= now - self.retention:
+                self._marks.popitem(last=False)
+            while len(self._marks) > self.maxsize:
+                _, at = self._marks.popitem(last=False)
+                self._floor = max(self._floor, at)
+
+    def since(self, user_id: int) -> float:
+        return max(self._marks.get(user_id, 0.0), self._floor)
+
+_invalidated_at = Invalidations(settings.PRINCIPAL_CACHE_SIZE, max(ACCESS_MIN, settings.JWT_MAX_TOKEN_MINUTES) * 60)
+
+def invalidate_principal(user_id: int) -> None:
+    _invalidated_at.mark(user_id)
+
+@event.listens_for(models.User, "after_update")
+def _user_updated(mapper, connection, target):
+    if inspect(target).attrs.role.history.has_changes():
+        invalidate_principal(target.id)
+
+@event.listens_for(models.User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    invalidate_principal(target.id)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def get_current_user(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Principal:
+    return await _principal(creds.credentials)
+
+async def get_stream_user(
+    creds: HTTPAuthorizationCredentials | None = Depends(optional_bearer),
+    access_token: str | None = Query(default=None, description="JWT, for clients that cannot send Authorization"),
+) -> Principal:
+    token = creds.credentials if creds else access_token
+    if not token:
+        raise _credentials_exception()
+    return await _principal(token)
+
+async def _principal(token: str) -> Principal:
+    credentials_exception = _credentials_exception()
+    cached = principal_cache.get(token)
+    if cached is not None:
+        principal, cached_at = cached
+        if _invalidated_at.since(principal.id) < cached_at:
+            return principal
     try:
-        token = creds.credentials
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[ALGO])
         sub: str = payload.get("sub")
         if sub is None:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.get(models.User, int(sub))
-    if not user:
+        uid = int(sub)
+    except (JWTError, ValueError):
         raise credentials_exception
-    return user
+    now = time.time()
+    role = payload.get("role")
+    # A claim is only as good as the marks kept for it: tokens living longer than that are looked up
+    trusted = payload.get("exp", 0) - payload.get("iat", 0) <= _invalidated_at.retention
+    if role and trusted and payload.get("iat", 0) > _invalidated_at.since(uid):
+        # Role carried in the token: no database round trip at all
+        principal = Principal(uid, models.Role(role))
+    else:
+        async with AsyncSessionLocal() as db:
+            user = await db.get(models.User, uid)
+            if not user:
+                raise credentials_exception
+            principal = Principal(user.id, user.role)
+    ttl = min(settings.PRINCIPAL_CACHE_TTL, payload.get("exp", now) - now)
+    if ttl > 0:
+        principal_cache.set(token, (principal, now), ttl=ttl)
+    return principal
 
-def require_roles(*roles: models.Role):
-    def checker(user: models.User = Depends(get_current_user)):
+def require_roles(*roles: models.Role, query_token: bool = False):
+    # async so the role check doesn't cost a threadpool hop on every request
+    async def checker(user: Principal = Depends(get_stream_user if query_token else get_current_user)):
         if user.role not in roles:
             raise HTTPException(status_code=403, detail="insufficient role")
         return user
@@ -1,9 +1,24 @@
+from .startup import FirstRequestTimer, report as startup_report
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import health, auth, geofences, locations, blockchain, alerts, imports
-from .db import Base, engine
-from sqlalchemy import text
+from .db import engine, async_engine, SessionLocal
 from .core.config import settings
+from .services.geofence_index import geofence_index
+from .services.geojson_cache import geojson_cache
+from .services.location_writer import location_writer
+from .services.importer import shutdown_hash_pool
+from .services.jobs import jobs
+from .services import partitions
+from .services.alert_transitions import alert_sweeper
+from .services.heatmap import heatmap
+from .services.metrics import MetricsMiddleware, instrument_engine
+from . import migrate
+
+# Timed individually for the startup report (GET /healthz/startup)
+health, auth, geofences, locations, blockchain, alerts, imports, metrics, analytics = (
+    startup_report.import_module(f"app.routers.{name}")
+    for name in ("health", "auth", "geofences", "locations", "blockchain", "alerts", "imports", "metrics", "analytics")
+)
 
 app = FastAPI(
     title="Smart Tourist Safety API",
@@ -25,25 +40,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset pagination cursor of GET /alerts/
+    expose_headers=["X-Next-Cursor"],
 )
 
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine, "async")
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(FirstRequestTimer, report=startup_report)
+
+def _warmup():
+    # Load the geofence index and prebuild the configured GeoJSON variants, so the first
+    # requests don't pay for it; without this both happen lazily on first use
+    zooms = [None if z.strip() == "full" else int(z) for z in settings.GEOJSON_WARMUP_ZOOMS.split(",") if z.strip()]
+    with SessionLocal() as db:
+        if settings.GEOFENCE_INDEX_ENABLED:
+            geofence_index.load(db)
+        for zoom in zooms:
+            geojson_cache.get(db, zoom)
+
 @app.on_event("startup")
 def on_startup():
-    # Ensure PostGIS extension exists, then create tables for MVP.
-    with engine.connect() as conn:
-        try:
-            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
-        except Exception:
-            pass
-    Base.metadata.create_all(bind=engine)
+    with startup_report.phase("schema"):
+        if settings.STARTUP_SCHEMA == "auto":
+            migrate.migrate()
+        elif settings.STARTUP_SCHEMA == "check":
+            migrate.check()
+    if partitions.partition_maintainer.interval > 0:
+        # Prepares partitions in the background before its first maintenance pass
+        partitions.partition_maintainer.start()
+    else:
+        with startup_report.phase("partitions"):
+            partitions.prepare()
+    if settings.STARTUP_WARMUP:
+        with startup_report.phase("warmup"):
+            _warmup()
+    if settings.LOCATION_WRITE_BEHIND:
+        location_writer.start()
+    alert_sweeper.start()
+    heatmap.start()
+    startup_report.ready()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if settings.LOCATION_WRITE_BEHIND:
+        location_writer.stop()
+    partitions.partition_maintainer.stop()
+    alert_sweeper.stop()
+    heatmap.stop()
+    jobs.shutdown()
+    shutdown_hash_pool()
+    await async_engine.dispose()
 
 app.include_router(health.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 app.include_router(auth.router, prefix="/auth")
 app.include_router(geofences.router, prefix="/geofences")
 app.include_router(locations.router, prefix="/locations")
 app.include_router(blockchain.router, prefix="/digital-ids")
 app.include_router(alerts.router, prefix="/alerts")
 app.include_router(imports.router, prefix="/imports")
+app.include_router(analytics.router, prefix="/analytics")
 
 # Friendly root endpoint
 @app.get("/")
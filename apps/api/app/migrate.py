@@ -0,0 +1,166 @@
+"""Versioned schema migrations.
+
+Run once per release, before the new app version starts serving:
+
+    python -m app.migrate            # apply pending migrations
+    python -m app.migrate --check    # exit 1 if any are pending
+    python -m app.migrate --partition-locations   # one-off: partition a pre-partitioning locations table
+
+Applied versions are recorded in schema_migrations, so app startup can verify the schema with
+one query (STARTUP_SCHEMA=check) instead of re-running create_all() and index checks on every boot.
+"""
+import argparse
+import logging
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from .db import Base, engine, ensure_indexes
+from .services import heatmap, partitions
+from .services.geofence_index import bump_version
+from .services.geometry import write_pieces
+
+log = logging.getLogger(__name__)
+
+# Serialises concurrent migrators (several replicas starting with STARTUP_SCHEMA=auto)
+MIGRATION_LOCK = 7_314_002
+
+
+def _baseline(conn: Connection) -> None:
+    # Everything the app used to bootstrap at startup: PostGIS, the declared tables and their indexes
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+    except Exception:
+        log.warning("could not create the postgis extension; assuming it is managed elsewhere")
+    Base.metadata.create_all(bind=conn)
+    ensure_indexes(conn)
+    # A partitioned locations table accepts no rows until it has a partition
+    if partitions.is_partitioned(conn):
+        partitions.ensure_partitions(conn)
+
+
+def _geofence_pieces(conn: Connection) -> None:
+    # area may hold the MultiPolygon make_valid() produces; bbox columns; subdivided pieces
+    conn.execute(text("ALTER TABLE geofences ALTER COLUMN area TYPE geometry(Geometry, 4326)"))
+    for col in ("min_lng", "min_lat", "max_lng", "max_lat"):
+        conn.execute(text(f"ALTER TABLE geofences ADD COLUMN IF NOT EXISTS {col} double precision"))
+    models.GeofencePiece.__table__.create(bind=conn, checkfirst=True)
+    conn.execute(text(
+        "UPDATE geofences SET area = ST_CollectionExtract(ST_MakeValid(area), 3) WHERE NOT ST_IsValid(area)"
+    ))
+    ids = conn.execute(text("SELECT id FROM geofences")).scalars().all()
+    write_pieces(conn, ids)
+    # Repaired shapes must reach every worker's index and caches
+    bump_version(conn)
+
+
+def _heatmap_cells(conn: Connection) -> None:
+    # Summary table for /analytics/heatmap, seeded from whatever history is still in the raw tables
+    models.HeatmapCell.__table__.create(bind=conn, checkfirst=True)
+    conn.execute(text("TRUNCATE heatmap_cells"))
+    heatmap.rebuild(conn)
+
+
+# (version, name, fn(conn)); append new migrations, never renumber or edit applied ones
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "geofence_pieces", _geofence_pieces),
+    (3, "heatmap_cells", _heatmap_cells),
+]
+
+
+def _ensure_table(conn: Connection) -> None:
+    conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        )
+        """
+    ))
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    exists = conn.execute(text("SELECT to_regclass('schema_migrations') IS NOT NULL")).scalar()
+    if not exists:
+        return set()
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def pending() -> list[tuple[int, str]]:
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+    return [(v, name) for v, name, _ in MIGRATIONS if v not in done]
+
+
+def migrate() -> list[int]:
+    """Apply pending migrations, each in its own transaction; returns the versions applied."""
+    applied = []
+    with engine.connect() as conn:
+        # Session-level lock, held across the per-migration transactions below
+        conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": MIGRATION_LOCK})
+        conn.commit()
+        try:
+            with conn.begin():
+                _ensure_table(conn)
+            done = applied_versions(conn)
+            conn.commit()
+            for version, name, fn in MIGRATIONS:
+                if version in done:
+                    continue
+                log.info("applying migration %d %s", version, name)
+                with conn.begin():
+                    fn(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                        {"v": version, "n": name},
+                    )
+                applied.append(version)
+        finally:
+            if conn.in_transaction():
+                conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATION_LOCK})
+            conn.commit()
+    return applied
+
+
+def check() -> None:
+    # Startup guard for STARTUP_SCHEMA=check: fail fast instead of serving against an old schema
+    missing = pending()
+    if missing:
+        raise RuntimeError(
+            "database schema is behind: pending migrations "
+            + ", ".join(f"{v} {name}" for v, name in missing)
+            + "; run `python -m app.migrate`"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrate", description="Apply or check schema migrations")
+    parser.add_argument("--check", action="store_true", help="exit 1 if migrations are pending, apply nothing")
+    parser.add_argument(
+        "--partition-locations", action="store_true",
+        help="after migrating, copy a locations table created before partitioning into a partitioned one",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.check:
+        missing = pending()
+        for v, name in missing:
+            print(f"pending: {v} {name}")
+        return 1 if missing else 0
+    applied = migrate()
+    print(f"applied {len(applied)} migration(s)" if applied else "schema is up to date")
+    if args.partition_locations:
+        with engine.begin() as conn:
+            old = partitions.convert_to_partitioned(conn)
+        print(f"locations is now partitioned; the old rows remain in {old}, drop it once verified" if old else "locations is already partitioned")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
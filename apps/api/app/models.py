@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Enum, JSON
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Float, ForeignKey, Boolean, Enum, JSON, Index, text
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from .db import Base
@@ -29,8 +29,31 @@ class Geofence(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     risk_level = Column(Enum(GeofenceRisk), default=GeofenceRisk.low, nullable=False)
-    area = Column(Geometry(geometry_type='POLYGON', srid=4326), nullable=False)
+    # Polygon, or MultiPolygon when make_valid() splits a self-intersecting ring (services.geometry.repair)
+    area = Column(Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False), nullable=False)
     active = Column(Boolean, default=True)
+    # Bounding box of area, maintained with the pieces by services.geometry.write_pieces
+    min_lng = Column(Float, nullable=True)
+    min_lat = Column(Float, nullable=True)
+    max_lng = Column(Float, nullable=True)
+    max_lat = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Declared explicitly (same name GeoAlchemy used to create implicitly) for bbox and KNN (<->) queries
+        Index("idx_geofences_area", "area", postgresql_using="gist"),
+    )
+
+class GeofencePiece(Base):
+    # ST_Subdivide output of geofences.area: point-in-polygon tests touch a few small pieces
+    # instead of the whole outline, however many vertices the geofence has
+    __tablename__ = "geofence_pieces"
+    id = Column(Integer, primary_key=True)
+    geofence_id = Column(Integer, ForeignKey("geofences.id", ondelete="CASCADE"), nullable=False, index=True)
+    geom = Column(Geometry(geometry_type='POLYGON', srid=4326, spatial_index=False), nullable=False)
+
+    __table_args__ = (
+        Index("idx_geofence_pieces_geom", "geom", postgresql_using="gist"),
+    )
 
 class LocationSource(str, enum.Enum):
     web = "web"
@@ -38,14 +61,43 @@ class LocationSource(str, enum.Enum):
     wearable = "wearable"
 
 class Location(Base):
+    # Range-partitioned on ts; partitions are created and dropped by services.partitions.
+    # Postgres requires the partition key in the primary key, hence (id, ts).
     __tablename__ = "locations"
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    ts = Column(DateTime, default=datetime.utcnow, index=True)
+    ts = Column(DateTime, primary_key=True, default=datetime.utcnow, index=True)
     position = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
     speed = Column(Integer, nullable=True)
     source = Column(Enum(LocationSource), default=LocationSource.web)
 
+    __table_args__ = (
+        # Per-user track range scans (GET /locations/{user_id}/track)
+        Index("ix_locations_user_ts", "user_id", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+class LocationTrack(Base):
+    # Downsampled per-user daily path, kept after the raw pings of that day are dropped
+    __tablename__ = "location_tracks"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(DateTime, primary_key=True)
+    path = Column(Geometry(geometry_type='LINESTRING', srid=4326), nullable=False)
+    points = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=False)
+
+class HeatmapCell(Base):
+    # Ping and alert counts per square grid cell and hour, kept current by services.heatmap.
+    # Cells are 360 / 2**level degrees; the key order serves level + hour range + bbox scans.
+    __tablename__ = "heatmap_cells"
+    level = Column(SmallInteger, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    cell_x = Column(Integer, primary_key=True)
+    cell_y = Column(Integer, primary_key=True)
+    pings = Column(Integer, nullable=False, default=0)
+    alerts = Column(Integer, nullable=False, default=0)
+
 class AlertType(str, enum.Enum):
     panic = "panic"
     geofence_breach = "geofence_breach"
@@ -66,3 +118,23 @@ class Alert(Base):
     severity = Column(Integer, default=1)
     status = Column(Enum(AlertStatus), default=AlertStatus.new)
     details = Column(JSON, nullable=True)
+
+    __table_args__ = (
+        # Breach dedup lookups only ever look at open alerts
+        Index(
+            "ix_alerts_open_breach",
+            "user_id", "geofence_id", "ts",
+            postgresql_where=text("status != 'resolved' AND type = 'geofence_breach'"),
+        ),
+        # Keyset pagination of /alerts on (ts, id), optionally filtered by status
+        Index("ix_alerts_ts_id", "ts", "id"),
+        Index("ix_alerts_status_ts_id", "status", "ts", "id"),
+        # Risk filter join and per-geofence lookups
+        Index("ix_alerts_geofence_id", "geofence_id"),
+    )
+
+class CacheVersion(Base):
+    # Monotonic version counters for in-process caches shared by every worker (e.g. "geofences")
+    __tablename__ = "cache_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
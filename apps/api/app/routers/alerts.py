@@ -1,48 +1,212 @@
-from fastapi import APIRouter, Depends, Query
+import base64
+import json
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from geoalchemy2.shape import to_shape
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import get_db, get_async_db, SessionLocal
 from .. import models
+from ..schemas import AlertBulkIn, AlertBulkOut, AlertListOut
+from ..core.config import settings
 from ..deps import require_roles
+from ..services.dedup import alert_dedup
+from ..services.geofence_index import geofence_index
+from ..services.live import broker, alert_event, StreamFilter
+from ..services.alert_transitions import announce, transition
 
 router = APIRouter(tags=["alerts"])
 
-@router.get("/", response_model=list)
-def list_alerts(
-    db: Session = Depends(get_db),
-    status: str | None = Query(default=None, description="Filter by status: new|ack|resolved"),
-    risk: str | None = Query(default=None, description="Filter by geofence risk: low|medium|high"),
-    offset: int = Query(default=0, ge=0),
-    limit: int = Query(default=50, ge=1, le=200),
-):
-    q = db.query(models.Alert)
-    # Filter by status
+EXPORT_BATCH = 5000
+STREAM_KEEPALIVE = 15.0
+STREAM_RETRY_MS = 3000
+
+ALERT_COLUMNS = (
+    models.Alert.id,
+    models.Alert.type,
+    models.Alert.user_id,
+    models.Alert.geofence_id,
+    models.Alert.severity,
+    models.Alert.status,
+    models.Alert.ts,
+)
+
+
+def _filtered(stmt, status: str | None, risk: str | None):
+    # Unknown filter values are ignored, as before
     if status:
         try:
-            st = models.AlertStatus(status)
-            q = q.filter(models.Alert.status == st)
-        except Exception:
+            stmt = stmt.where(models.Alert.status == models.AlertStatus(status))
+        except ValueError:
             pass
-    # Filter by geofence risk via join
     if risk:
         try:
             rk = models.GeofenceRisk(risk)
-            from sqlalchemy import and_
-            q = q.join(models.Geofence, models.Geofence.id == models.Alert.geofence_id).filter(models.Geofence.risk_level == rk)
-        except Exception:
+            stmt = stmt.join(models.Geofence, models.Geofence.id == models.Alert.geofence_id).where(models.Geofence.risk_level == rk)
+        except ValueError:
             pass
-    rows = q.order_by(models.Alert.id.desc()).offset(offset).limit(limit).all()
-    # Pydantic model not defined for full alert; return minimal fields
-    return [
-        {
-            "id": a.id,
-            "type": a.type.value if hasattr(a.type, 'value') else str(a.type),
-            "user_id": a.user_id,
-            "geofence_id": a.geofence_id,
-            "severity": a.severity,
-            "status": a.status.value if hasattr(a.status, 'value') else str(a.status),
-        }
-        for a in rows
-    ]
+    return stmt
+
+
+def _encode_cursor(ts: datetime, alert_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{alert_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        ts, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(alert_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _row_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "type": row.type.value,
+        "user_id": row.user_id,
+        "geofence_id": row.geofence_id,
+        "severity": row.severity,
+        "status": row.status.value if row.status else None,
+        "ts": row.ts,
+    }
+
+
+@router.get("/", response_model=list[AlertListOut])
+async def list_alerts(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    status: str | None = Query(default=None, description="Filter by status: new|ack|resolved"),
+    risk: str | None = Query(default=None, description="Filter by geofence risk: low|medium|high"),
+    cursor: str | None = Query(default=None, description="Opaque X-Next-Cursor from the previous page (keyset pagination)"),
+    offset: int = Query(default=0, ge=0, description="Ignored when cursor is given"),
+    limit: int = Query(default=50, ge=1, le=200),
+):
+    # Newest first on (ts, id); served by ix_alerts_ts_id / ix_alerts_status_ts_id
+    stmt = _filtered(select(*ALERT_COLUMNS), status, risk)
+    if cursor:
+        cur_ts, cur_id = _decode_cursor(cursor)
+        stmt = stmt.where(tuple_(models.Alert.ts, models.Alert.id) < tuple_(cur_ts, cur_id))
+    else:
+        stmt = stmt.offset(offset)
+    rows = (await db.execute(stmt.order_by(models.Alert.ts.desc(), models.Alert.id.desc()).limit(limit))).all()
+    if len(rows) == limit and rows[-1].ts is not None:
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].ts, rows[-1].id)
+    return [_row_dict(r) for r in rows]
+
+
+@router.get("/export", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
+def export_alerts(
+    status: str | None = Query(default=None, description="Filter by status: new|ack|resolved"),
+    risk: str | None = Query(default=None, description="Filter by geofence risk: low|medium|high"),
+    since: datetime | None = Query(default=None, description="Only alerts at or after this time (UTC)"),
+    until: datetime | None = Query(default=None, description="Only alerts before this time (UTC)"),
+):
+    # NDJSON stream over a server-side cursor: memory stays flat however many alerts match
+    stmt = _filtered(select(*ALERT_COLUMNS), status, risk)
+    if since:
+        stmt = stmt.where(models.Alert.ts >= since)
+    if until:
+        stmt = stmt.where(models.Alert.ts < until)
+    stmt = stmt.order_by(models.Alert.ts, models.Alert.id).execution_options(yield_per=EXPORT_BATCH)
+
+    def lines():
+        # The request-scoped session is closed before streaming starts, so use our own
+        with SessionLocal() as s:
+            for part in s.execute(stmt).partitions():
+                yield "".join(json.dumps(_row_dict(r), default=datetime.isoformat) + "\n" for r in part)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _change_event(a: models.Alert) -> dict:
+    # Risk and position let stream subscribers filter without a lookup per event
+    gf = geofence_index.get(a.geofence_id) if a.geofence_id else None
+    pt = to_shape(a.location) if a.location is not None else None
+    return alert_event(a, gf.risk_level if gf else None, pt.x if pt else None, pt.y if pt else None)
+
+
+def _parse_bbox(bbox: str | None) -> tuple[float, float, float, float] | None:
+    if not bbox:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+@router.get("/stream", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police, query_token=True))])
+async def stream_alerts(
+    request: Request,
+    status: str | None = Query(default=None, description="Only events for alerts in this status: new|ack|resolved"),
+    risk: str | None = Query(default=None, description="Only events for geofences of this risk: low|medium|high"),
+    bbox: str | None = Query(default=None, description="min_lng,min_lat,max_lng,max_lat"),
+    last_event_id: str | None = Query(default=None, description="Resume after this event id (or send Last-Event-ID)"),
+):
+    # Server-Sent Events fed by the in-process broker; replaces polling GET /alerts/
+    flt = StreamFilter(risk=risk, status=status, bbox=_parse_bbox(bbox))
+    last_id = request.headers.get("last-event-id") or last_event_id
+
+    async def events():
+        # Subscribed only once the body starts, so a client gone before then leaves nothing behind
+        sub, reset = broker.subscribe(flt, last_id)
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            if reset:
+                # Events since the client's last id are gone: it should refetch GET /alerts/
+                yield "event: reset\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                batch, lagged = await sub.next(STREAM_KEEPALIVE)
+                if lagged:
+                    yield "event: lagged\ndata: {}\n\n"
+                if not batch:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(f"id: {ev.id}\nevent: {ev.type}\ndata: {ev.payload}\n\n" for ev in batch)
+        finally:
+            broker.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _bulk_criteria(body: AlertBulkIn) -> list:
+    criteria = []
+    if body.ids is not None:
+        if len(body.ids) > settings.ALERT_BULK_MAX_IDS:
+            raise HTTPException(status_code=413, detail=f"at most {settings.ALERT_BULK_MAX_IDS} ids per request")
+        criteria.append(models.Alert.id.in_(body.ids))
+    if body.geofence_id is not None:
+        criteria.append(models.Alert.geofence_id == body.geofence_id)
+    if body.older_than_minutes is not None:
+        criteria.append(models.Alert.ts < datetime.utcnow() - timedelta(minutes=body.older_than_minutes))
+    if body.min_severity is not None:
+        criteria.append(models.Alert.severity >= body.min_severity)
+    if body.max_severity is not None:
+        criteria.append(models.Alert.severity <= body.max_severity)
+    if not criteria:
+        # Never "every open alert" by accident
+        raise HTTPException(status_code=400, detail="give ids or at least one filter")
+    return criteria
+
+
+def _bulk(body: AlertBulkIn, status: models.AlertStatus, db: Session) -> dict:
+    rows = transition(db, status, *_bulk_criteria(body))
+    db.commit()
+    announce(rows, status)
+    return {"status": status.value, "count": len(rows), "ids": [r.id for r in rows]}
+
+
+# Declared before the /{alert_id}/... routes, which would otherwise capture "bulk"
+@router.post("/bulk/acknowledge", response_model=AlertBulkOut, dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
+def acknowledge_alerts(body: AlertBulkIn, db: Session = Depends(get_db)):
+    # New alerts matching the criteria become ack; ids lists the alerts actually changed
+    return _bulk(body, models.AlertStatus.ack, db)
+
+@router.post("/bulk/resolve", response_model=AlertBulkOut, dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
+def resolve_alerts(body: AlertBulkIn, db: Session = Depends(get_db)):
+    return _bulk(body, models.AlertStatus.resolved, db)
 
 @router.post("/{alert_id}/acknowledge", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
 def acknowledge_alert(alert_id: int, db: Session = Depends(get_db)):
@@ -50,7 +214,9 @@ def acknowledge_alert(alert_id: int, db: Session = Depends(get_db)):
     if not a:
         return {"ok": False, "error": "not found"}
     a.status = models.AlertStatus.ack
+    ev = _change_event(a)
     db.commit()
+    broker.publish("alert.updated", ev)
     return {"ok": True, "id": a.id, "status": a.status.value}
 
 @router.post("/{alert_id}/resolve", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
@@ -59,5 +225,8 @@ def resolve_alert(alert_id: int, db: Session = Depends(get_db)):
     if not a:
         return {"ok": False, "error": "not found"}
     a.status = models.AlertStatus.resolved
+    ev = _change_event(a)
     db.commit()
+    alert_dedup.invalidate(a.user_id, a.geofence_id)
+    broker.publish("alert.updated", ev)
     return {"ok": True, "id": a.id, "status": a.status.value}
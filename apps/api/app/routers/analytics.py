@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..db import get_async_db
+from .. import models
+from ..deps import require_roles
+from ..core.config import settings
+from ..services.heatmap import cell, cell_size, hour_of, levels
+
+router = APIRouter(tags=["analytics"])
+
+# Per-cell totals and per-hour totals over the same primary-key range scan of heatmap_cells
+HEATMAP_SQL = text("""
+SELECT cell_x, cell_y, hour, sum(pings) AS pings, sum(alerts) AS alerts, GROUPING(hour) AS per_cell
+FROM heatmap_cells
+WHERE level = :level AND hour >= :start AND hour < :end
+  AND cell_x BETWEEN :x0 AND :x1 AND cell_y BETWEEN :y0 AND :y1
+GROUP BY GROUPING SETS ((cell_x, cell_y), (hour))
+""")
+
+
+def _parse_bbox(bbox: str) -> tuple[float, float, float, float]:
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    if min_lng > max_lng or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox min must not exceed max")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def _utc_naive(ts: datetime | None) -> datetime | None:
+    # heatmap_cells.hour is naive UTC like every other timestamp column
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _cell_range(bbox, level: int) -> tuple[int, int, int, int]:
+    x0, y0 = cell(bbox[0], bbox[1], level)
+    x1, y1 = cell(bbox[2], bbox[3], level)
+    return x0, y0, x1, y1
+
+
+def _pick_level(bbox, res: int | None) -> int:
+    # Explicit res must be a counted level; otherwise the finest level that fits HEATMAP_MAX_CELLS
+    available = levels()
+    if res is not None:
+        if res not in available:
+            raise HTTPException(status_code=400, detail=f"res must be one of {available}")
+        candidates = [res]
+    else:
+        candidates = sorted(available, reverse=True)
+    for level in candidates:
+        x0, y0, x1, y1 = _cell_range(bbox, level)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= settings.HEATMAP_MAX_CELLS:
+            return level
+    raise HTTPException(status_code=400, detail="bbox too large for this resolution; zoom in or pick a coarser res")
+
+
+@router.get("/heatmap", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
+async def heatmap(
+    bbox: str = Query(description="min_lng,min_lat,max_lng,max_lat"),
+    res: int | None = Query(default=None, description="Grid level (cell = 360/2**res degrees); default: finest that fits"),
+    start: datetime | None = Query(default=None, alias="from", description="UTC, snapped down to the hour; default 24h before to"),
+    end: datetime | None = Query(default=None, alias="to", description="UTC, exclusive; default now"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Ping and alert density from the precomputed summary: cost depends on cells x hours, not on
+    # raw history. Counts lag live ingest by up to HEATMAP_FLUSH_SECONDS.
+    if not settings.HEATMAP_ENABLED:
+        raise HTTPException(status_code=404, detail="heatmap disabled")
+    box = _parse_bbox(bbox)
+    level = _pick_level(box, res)
+    end = _utc_naive(end) or datetime.utcnow()
+    start = hour_of(_utc_naive(start) or end - timedelta(hours=24))
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if end - start > timedelta(days=settings.HEATMAP_MAX_RANGE_DAYS):
+        raise HTTPException(status_code=400, detail=f"at most {settings.HEATMAP_MAX_RANGE_DAYS} days per request")
+    x0, y0, x1, y1 = _cell_range(box, level)
+    rows = (await db.execute(HEATMAP_SQL, {
+        "level": level, "start": start, "end": end, "x0": x0, "x1": x1, "y0": y0, "y1": y1,
+    })).all()
+    size = cell_size(level)
+    cells, hours = [], []
+    for r in rows:
+        if r.per_cell:
+            # South-west corner of the cell; the cell spans cell_deg in each direction
+            cells.append([r.cell_x * size - 180.0, r.cell_y * size - 90.0, int(r.pings), int(r.alerts)])
+        else:
+            hours.append([r.hour.isoformat(), int(r.pings), int(r.alerts)])
+    hours.sort()
+    return {
+        "res": level,
+        "cell_deg": size,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "cells": cells,
+        "hours": hours,
+    }
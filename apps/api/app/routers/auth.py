@@ -1,29 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import get_db, get_async_db
 from .. import models
-from ..schemas import UserCreate, UserOut, TokenOut
+from ..schemas import UserCreate, UserOut, TokenOut, RoleUpdate
+from ..core.config import settings
+from ..deps import require_roles, invalidate_principal
 from ..security import hash_password, verify_password, create_access_token
 from fastapi.security import OAuth2PasswordRequestForm
 
 router = APIRouter(tags=["auth"])
 
 @router.post("/register", response_model=UserOut)
-def register(payload: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == payload.email).first()
+async def register(payload: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.scalar(select(models.User.id).where(models.User.email == payload.email))
     if existing:
         raise HTTPException(status_code=400, detail="email already registered")
-    user = models.User(email=payload.email, password_hash=hash_password(payload.password), role=payload.role)
+    # pbkdf2 is CPU-bound; keep it off the event loop
+    password_hash = await run_in_threadpool(hash_password, payload.password)
+    user = models.User(email=payload.email, password_hash=password_hash, role=payload.role)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 @router.post("/login", response_model=TokenOut)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # OAuth2 form provides `username` & `password`. We use username as email.
-    user = db.query(models.User).filter(models.User.email == form.username).first()
-    if not user or not verify_password(form.password, user.password_hash):
+    user = await db.scalar(select(models.User).where(models.User.email == form.username))
+    if not user or not await run_in_threadpool(verify_password, form.password, user.password_hash):
         raise HTTPException(status_code=401, detail="invalid credentials")
-    token = create_access_token(str(user.id))
+    token = create_access_token(str(user.id), role=user.role.value if settings.JWT_ROLE_CLAIM else None)
     return {"access_token": token, "token_type": "bearer"}
+
+@router.patch("/users/{user_id}/role", response_model=UserOut, dependencies=[Depends(require_roles(models.Role.admin))])
+def update_role(user_id: int, body: RoleUpdate, db: Session = Depends(get_db)):
+    user = db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="not found")
+    user.role = models.Role(body.role.value)
+    db.commit()
+    # The User update hook already fired at flush; repeat after commit so a lookup racing the commit can't re-cache the old role
+    invalidate_principal(user.id)
+    db.refresh(user)
+    return user
@@ -1,45 +1,46 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from web3 import Web3
-from hexbytes import HexBytes
 from ..core.config import settings
+from ..services.digital_id import get_client
 
 router = APIRouter(tags=["blockchain"])
 
-# Minimal ABI for DigitalIDRegistry.get(bytes32) -> (bytes32 idHash, address issuer, uint8 status)
-ABI = [
-    {
-        "inputs": [{"internalType": "bytes32", "name": "idHash", "type": "bytes32"}],
-        "name": "get",
-        "outputs": [
-            {"internalType": "bytes32", "name": "idHash", "type": "bytes32"},
-            {"internalType": "address", "name": "issuer", "type": "address"},
-            {"internalType": "uint8", "name": "status", "type": "uint8"},
-        ],
-        "stateMutability": "view",
-        "type": "function",
-    }
-]
-
 class VerifyOut(BaseModel):
     found: bool
     issuer: str | None = None
     status: int | None = None
 
-@router.get("/verify", response_model=VerifyOut)
-def verify(id_hash: str):
+class VerifyBatchIn(BaseModel):
+    id_hashes: list[str]
+
+class VerifyBatchItem(VerifyOut):
+    id_hash: str
+
+def _verify_many(id_hashes: list[str]):
     if not settings.CONTRACT_ADDRESS:
         raise HTTPException(status_code=400, detail="contract not configured")
     try:
-        w3 = Web3(Web3.HTTPProvider(settings.POLYGON_RPC_URL))
-        contract = w3.eth.contract(address=Web3.to_checksum_address(settings.CONTRACT_ADDRESS), abi=ABI)
-        # accept hex string with or without 0x
-        hex_hash = id_hash if id_hash.startswith("0x") else "0x" + id_hash
-        result = contract.functions.get(HexBytes(hex_hash)).call()
-        # If idHash is zero, treat as not found
-        found = any(int(b) != 0 for b in result[0])
-        if not found:
-            return VerifyOut(found=False)
-        return VerifyOut(found=True, issuer=result[1], status=int(result[2]))
+        return get_client().verify_many(id_hashes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        # requests is only loaded along with web3, on first use
+        from requests.exceptions import Timeout
+        if isinstance(e, Timeout):
+            raise HTTPException(status_code=504, detail="RPC node timed out")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/verify", response_model=VerifyOut)
+def verify(id_hash: str):
+    v = _verify_many([id_hash])[0]
+    return VerifyOut(found=v.found, issuer=v.issuer, status=v.status)
+
+@router.post("/verify/batch", response_model=list[VerifyBatchItem])
+def verify_batch(body: VerifyBatchIn):
+    if len(body.id_hashes) > settings.DIGITAL_ID_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {settings.DIGITAL_ID_BATCH_MAX} id hashes per batch")
+    results = _verify_many(body.id_hashes)
+    return [
+        VerifyBatchItem(id_hash=h, found=v.found, issuer=v.issuer, status=v.status)
+        for h, v in zip(body.id_hashes, results)
+    ]
@@ -1,27 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import text
 from geoalchemy2.shape import from_shape
 from shapely.geometry import Polygon
-from ..db import get_db
+from ..db import get_db, get_async_db
 from .. import models
-from ..schemas import GeofenceCreate, GeofenceOut
+from ..schemas import GeofenceCreate, GeofenceOut, GeofenceRisk, NearbyGeofenceOut
 from ..deps import require_roles
+from ..services.geofence_index import IndexedGeofence, bump_version, geofence_index
+from ..services.geojson_cache import MAX_ZOOM, geojson_cache, zoom_for_tolerance
+from ..services.geofence_index import read_version
+from ..services.tile_cache import tile_cache
+from ..services.proximity import nearby_async, risks_from
+from ..services.geometry import repair, write_pieces
+from ..services import backfill
+from ..services.jobs import jobs
+from ..core.config import settings
 
 router = APIRouter(tags=["geofences"])
 
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+GEOFENCE_TILE_SQL = text("""
+WITH bounds AS (SELECT ST_TileEnvelope(:z, :x, :y) AS geom),
+mvt AS (
+    SELECT ST_AsMVTGeom(ST_Transform(g.area, 3857), bounds.geom, 4096, 64, true) AS geom,
+           g.id, g.name, g.risk_level::text AS risk_level
+    FROM geofences g, bounds
+    WHERE g.active AND g.area && ST_Transform(bounds.geom, 4326)
+)
+SELECT ST_AsMVT(mvt, 'geofences', 4096, 'geom') FROM mvt
+""")
+
+# Open alerts binned into a 64x64 grid per tile, so the layer stays small at any zoom
+ALERT_DENSITY_TILE_SQL = text("""
+WITH bounds AS (SELECT ST_TileEnvelope(:z, :x, :y) AS geom),
+cells AS (
+    SELECT ST_SnapToGrid(ST_Transform(a.location, 3857), (ST_XMax(bounds.geom) - ST_XMin(bounds.geom)) / 64) AS cell,
+           count(*) AS count, max(a.severity) AS max_severity
+    FROM alerts a, bounds
+    WHERE a.location && ST_Transform(bounds.geom, 4326) AND a.status != 'resolved'
+    GROUP BY 1
+),
+mvt AS (
+    SELECT ST_AsMVTGeom(cells.cell, bounds.geom, 4096, 64, true) AS geom, cells.count, cells.max_severity
+    FROM cells, bounds
+)
+SELECT ST_AsMVT(mvt, 'alerts', 4096, 'geom') FROM mvt
+""")
+
 @router.post("/", response_model=GeofenceOut, dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
 def create_geofence(body: GeofenceCreate, db: Session = Depends(get_db)):
     try:
-        poly = Polygon(body.coordinates[0])
+        poly = repair(Polygon(body.coordinates[0]))
     except Exception:
         raise HTTPException(status_code=400, detail="invalid polygon coordinates")
     geom = from_shape(poly, srid=4326)
     gf = models.Geofence(name=body.name, risk_level=body.risk_level, area=geom, active=True)
     db.add(gf)
+    db.flush()
+    write_pieces(db, [gf.id])
+    version = bump_version(db)
     db.commit()
     db.refresh(gf)
-    return gf
+    geofence_index.apply(version, upserted=[IndexedGeofence(gf.id, gf.name, gf.risk_level, True, poly)])
+    out = GeofenceOut.model_validate(gf)
+    job = backfill.submit([gf.id])
+    if job is not None:
+        out.backfill_job_id = job.id
+    return out
 
 @router.get("/", response_model=list[GeofenceOut])
 def list_geofences(db: Session = Depends(get_db)):
@@ -34,35 +82,99 @@ def delete_geofence(gid: int, db: Session = Depends(get_db)):
     if not gf:
         raise HTTPException(status_code=404, detail="not found")
     db.delete(gf)
+    version = bump_version(db)
     db.commit()
+    geofence_index.apply(version, removed=[gid])
     return {"ok": True}
 
+@router.post("/{gid}/backfill", status_code=202, dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
+def backfill_geofence(
+    gid: int,
+    hours: float | None = Query(default=None, gt=0, description="History to check (default GEOFENCE_BACKFILL_HOURS); capped at GEOFENCE_BACKFILL_MAX_HOURS"),
+    db: Session = Depends(get_db),
+):
+    # Alert users whose recent pings fall inside this geofence (runs as a background job)
+    if not db.get(models.Geofence, gid):
+        raise HTTPException(status_code=404, detail="not found")
+    job = backfill.submit([gid], hours or settings.GEOFENCE_BACKFILL_HOURS or settings.GEOFENCE_BACKFILL_MAX_HOURS)
+    if job is None:
+        raise HTTPException(status_code=400, detail="backfill is disabled (GEOFENCE_BACKFILL_MAX_HOURS=0)")
+    return job.as_dict()
+
+def _backfill_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job or job.kind != "backfill_geofences":
+        raise HTTPException(status_code=404, detail="not found")
+    return job
+
+@router.get("/backfill/{job_id}", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
+def backfill_job(job_id: str):
+    return _backfill_job(job_id).as_dict()
+
+@router.post("/backfill/{job_id}/cancel", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
+def cancel_backfill(job_id: str):
+    # Stops after the chunk in progress; alerts already created are kept
+    _backfill_job(job_id)
+    return jobs.cancel(job_id).as_dict()
+
 @router.get("/geojson")
-def geofences_geojson(db: Session = Depends(get_db)):
-    rows = db.query(
-        models.Geofence.id,
-        models.Geofence.name,
-        models.Geofence.risk_level,
-        func.ST_AsGeoJSON(models.Geofence.area)
-    ).all()
-    features = []
-    for gid, name, risk, gj in rows:
-        try:
-            geometry = None
-            if gj:
-                # ST_AsGeoJSON returns a JSON string
-                import json
-                geometry = json.loads(gj)
-            features.append({
-                "type": "Feature",
-                "geometry": geometry,
-                "properties": {
-                    "id": gid,
-                    "name": name,
-                    "risk_level": risk.value if hasattr(risk, 'value') else str(risk),
-                },
-            })
-        except Exception:
-            continue
-    return {"type": "FeatureCollection", "features": features}
+async def geofences_geojson(
+    request: Request,
+    zoom: int | None = Query(default=None, ge=0, le=MAX_ZOOM, description="Map zoom; geometry is simplified to about one pixel"),
+    tolerance: float | None = Query(default=None, gt=0, description="Simplification tolerance in degrees (snapped to a zoom level)"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Served from a per-version cache; unchanged layers answer 304 to If-None-Match
+    if zoom is None and tolerance is not None:
+        zoom = zoom_for_tolerance(tolerance)
+    etag, body = await geojson_cache.get_async(db, zoom)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/nearby", response_model=list[NearbyGeofenceOut], dependencies=[Depends(require_roles(models.Role.tourist, models.Role.operator, models.Role.police, models.Role.admin))])
+async def geofences_nearby(
+    lat: float = Query(ge=-90, le=90),
+    lng: float = Query(ge=-180, le=180),
+    radius: float = Query(default=500, gt=0, description="Metres"),
+    limit: int = Query(default=10, ge=1),
+    min_risk: GeofenceRisk = Query(default=GeofenceRisk.low, description="Only geofences at or above this risk"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Nearest first by true distance in metres; 0 when the point is inside
+    radius = min(radius, settings.NEARBY_MAX_RADIUS_M)
+    limit = min(limit, settings.NEARBY_MAX_LIMIT)
+    return await nearby_async(db, lng, lat, radius, limit, risks_from(min_risk.value))
 
+@router.get("/tiles/{z}/{x}/{y}.pbf")
+def geofence_tile(
+    z: int,
+    x: int,
+    y: int,
+    request: Request,
+    alerts: bool = Query(default=False, description="Add an 'alerts' layer with open-alert density"),
+    db: Session = Depends(get_db),
+):
+    if not 0 <= z <= MAX_ZOOM or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise HTTPException(status_code=404, detail="tile out of range")
+    # Geofence changes invalidate the affected cached tiles through the index listener
+    if settings.GEOFENCE_INDEX_ENABLED:
+        geofence_index.ensure_fresh(db)
+    else:
+        tile_cache.check_version(read_version(db))
+    key = ("geofences", z, x, y)
+    cached = tile_cache.get(key)
+    if cached is None:
+        generation = tile_cache.generation
+        data = db.execute(GEOFENCE_TILE_SQL, {"z": z, "x": x, "y": y}).scalar() or b""
+        cached = tile_cache.set(key, bytes(data), generation)
+    etag, data = cached
+    if not alerts:
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=data, media_type=MVT_MEDIA_TYPE, headers=headers)
+    # Alerts change constantly and are never cached; MVT layers can simply be concatenated
+    density = db.execute(ALERT_DENSITY_TILE_SQL, {"z": z, "x": x, "y": y}).scalar() or b""
+    return Response(content=data + bytes(density), media_type=MVT_MEDIA_TYPE, headers={"Cache-Control": "no-store"})
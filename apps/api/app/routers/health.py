@@ -1,7 +1,14 @@
 from fastapi import APIRouter
 
+from ..startup import report
+
 router = APIRouter(tags=["health"])
 
 @router.get("/healthz")
 def healthz():
     return {"status": "ok"}
+
+@router.get("/healthz/startup")
+def startup_report():
+    # Router import times, startup phases, and time to ready / first request (ms since boot)
+    return report.as_dict()
@@ -1,65 +1,40 @@
-import csv
-from io import StringIO
+import tempfile
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
-from shapely.geometry import Polygon
-from geoalchemy2.shape import from_shape
-from ..db import get_db
 from .. import models
 from ..deps import require_roles
+from ..services import importer
+from ..services.jobs import jobs
 
 router = APIRouter(tags=["imports"])
 
-@router.post("/geofences", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
-async def import_geofences(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    if not file.filename.endswith(".csv"):
-        raise HTTPException(status_code=400, detail="upload a .csv file")
-    text = (await file.read()).decode("utf-8", errors="ignore")
-    reader = csv.DictReader(StringIO(text))
-    created = 0
-    errors = []
-    for i, row in enumerate(reader, start=1):
-        try:
-            name = row.get("name")
-            risk = row.get("risk_level", "low").lower()
-            # coords as JSON-like string: [[lng,lat], ... ]
-            coords_str = row.get("coordinates")
-            if not name or not coords_str:
-                raise ValueError("missing name/coordinates")
-            # parse coordinates string into list
-            coords = eval(coords_str)  # trusted admin input; in production, use json.loads
-            poly = Polygon(coords)
-            geom = from_shape(poly, srid=4326)
-            gf = models.Geofence(name=name, risk_level=models.GeofenceRisk(risk), area=geom, active=True)
-            db.add(gf)
-            created += 1
-        except Exception as e:
-            errors.append({"row": i, "error": str(e)})
-    db.commit()
-    return {"created": created, "errors": errors}
+UPLOAD_CHUNK = 1 << 20
 
-@router.post("/users", dependencies=[Depends(require_roles(models.Role.admin))])
-async def import_users(file: UploadFile = File(...), db: Session = Depends(get_db)):
+
+async def _spool_upload(file: UploadFile) -> str:
+    # Copy the upload to our own temp file in fixed-size chunks; the request's file is closed once we return
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="upload a .csv file")
-    text = (await file.read()).decode("utf-8", errors="ignore")
-    reader = csv.DictReader(StringIO(text))
-    created = 0
-    errors = []
-    for i, row in enumerate(reader, start=1):
-        try:
-            email = row.get("email")
-            password = row.get("password")
-            role = row.get("role", "tourist")
-            if not email or not password:
-                raise ValueError("missing email/password")
-            if db.query(models.User).filter(models.User.email == email).first():
-                continue
-            from ..security import hash_password
-            user = models.User(email=email, password_hash=hash_password(password), role=models.Role(role))
-            db.add(user)
-            created += 1
-        except Exception as e:
-            errors.append({"row": i, "error": str(e)})
-    db.commit()
-    return {"created": created, "errors": errors}
+    with tempfile.NamedTemporaryFile(prefix="import-", suffix=".csv", delete=False) as tmp:
+        while chunk := await file.read(UPLOAD_CHUNK):
+            tmp.write(chunk)
+    return tmp.name
+
+
+@router.post("/geofences", status_code=202, dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
+async def import_geofences(file: UploadFile = File(...)):
+    path = await _spool_upload(file)
+    job = jobs.submit("import_geofences", importer.import_geofences, path, files=[path])
+    return job.as_dict()
+
+@router.post("/users", status_code=202, dependencies=[Depends(require_roles(models.Role.admin))])
+async def import_users(file: UploadFile = File(...)):
+    path = await _spool_upload(file)
+    job = jobs.submit("import_users", importer.import_users, path, files=[path])
+    return job.as_dict()
+
+@router.get("/jobs/{job_id}", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator))])
+def import_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job or not job.kind.startswith("import_"):
+        raise HTTPException(status_code=404, detail="not found")
+    return job.as_dict()
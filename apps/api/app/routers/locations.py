@@ -1,62 +1,324 @@
-from fastapi import APIRouter, Depends
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from geoalchemy2.shape import from_shape
-from shapely.geometry import Point
-from ..db import get_db
+from sqlalchemy import func, insert, select, and_, values, column, text, Integer, Float
+from ..db import get_async_db, SessionLocal
 from .. import models
-from ..schemas import LocationIn, AlertOut
+from ..schemas import LocationIn, LocationBatchIn, AlertOut, PointAlertsOut, IngestOut, OccupancyOut
 from ..deps import require_roles
-from datetime import datetime, timedelta
+from ..core.config import settings
+from ..services.geofence_index import geofence_index
+from ..services.dedup import alert_dedup
+from ..services.location_writer import location_writer, WriterFull
+from ..services.live import broker, alert_event
+from ..services.proximity import nearby_async, risks_from
+from ..services.occupancy import Stay, occupancy
+from ..services.heatmap import heatmap
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter(tags=["locations"])
 
-@router.post("/ingest", response_model=list[AlertOut], dependencies=[Depends(require_roles(models.Role.tourist, models.Role.operator, models.Role.police, models.Role.admin))])
-def ingest_location(body: LocationIn, db: Session = Depends(get_db)):
-    pt = Point(body.lng, body.lat)
-    geom = from_shape(pt, srid=4326)
+# Track points written to the response per chunk
+TRACK_WRITE_BATCH = 1000
 
-    loc = models.Location(
-        user_id=body.user_id,
-        position=geom,
-        speed=body.speed,
-        source=models.LocationSource(body.source or "web"),
+# Merge exit time and dwell into an entry alert's details (JSON column, merged as jsonb)
+ALERT_EXIT_SQL = text(
+    "UPDATE alerts SET details = (COALESCE(details::jsonb, '{}'::jsonb) || CAST(:patch AS jsonb))::json WHERE id = :id"
+)
+
+# Raw pings of one user in [start, end), simplified in PostGIS; M carries the epoch of each kept vertex
+RAW_TRACK_SQL = text(
+    """
+    SELECT ST_X(d.geom), ST_Y(d.geom), ST_M(d.geom)
+    FROM (
+        SELECT ST_Simplify(
+                   ST_MakeLine(ST_MakePointM(ST_X(position), ST_Y(position), extract(epoch FROM ts)) ORDER BY ts),
+                   :tolerance, true
+               ) AS line
+        FROM locations
+        WHERE user_id = :user_id AND ts >= :start AND ts < :end
+    ) s, ST_DumpPoints(s.line) d
+    ORDER BY d.path
+    """
+)
+
+# Daily rollups (services.partitions) for days whose raw pings have been dropped
+ROLLUP_TRACK_SQL = text(
+    """
+    SELECT t.day, ST_X(d.geom), ST_Y(d.geom)
+    FROM location_tracks t, ST_DumpPoints(ST_Simplify(t.path, :tolerance, true)) d
+    WHERE t.user_id = :user_id AND t.day >= :day_from AND t.day < :end
+    ORDER BY t.day, d.path
+    """
+)
+
+
+def _utc_naive(ts: datetime | None) -> datetime:
+    if ts is None:
+        return datetime.utcnow()
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _ewkt(lng: float, lat: float) -> str:
+    return f"SRID=4326;POINT({lng} {lat})"
+
+
+async def _match_points(db: AsyncSession, points: list[LocationIn]) -> list[list]:
+    # Intersecting active geofences per point (in-process index; one PostGIS join when the index is disabled)
+    if settings.GEOFENCE_INDEX_ENABLED:
+        # An index reload after a geofence change runs in a worker thread, off the event loop
+        await geofence_index.ensure_fresh_async(db)
+        return geofence_index.match_many([p.lng for p in points], [p.lat for p in points])
+    return await db.run_sync(_match_points_db, points)
+
+
+def _match_points_db(db: Session, points: list[LocationIn]) -> list[list]:
+    pts = values(column("i", Integer), column("lng", Float), column("lat", Float), name="pts").data(
+        [(i, p.lng, p.lat) for i, p in enumerate(points)]
     )
-    db.add(loc)
-    db.flush()
-
-    # Find intersecting active geofences
-    gfs = db.query(models.Geofence).filter(
-        models.Geofence.active == True,
-        func.ST_Intersects(models.Geofence.area, func.ST_SetSRID(func.ST_Point(body.lng, body.lat), 4326))
-    ).all()
-
-    alerts_created = []
-    window_start = datetime.utcnow() - timedelta(minutes=5)
-    for gf in gfs:
-        # Dedup: if a recent non-resolved alert exists for same user+geofence, skip
-        existing = db.query(models.Alert).filter(
-            models.Alert.type == models.AlertType.geofence_breach,
-            models.Alert.user_id == body.user_id,
-            models.Alert.geofence_id == gf.id,
-            models.Alert.ts >= window_start,
-            models.Alert.status != models.AlertStatus.resolved,
-        ).first()
-        if existing:
-            continue
-        alert = models.Alert(
-            type=models.AlertType.geofence_breach,
-            user_id=body.user_id,
-            geofence_id=gf.id,
-            location=geom,
-            severity=2 if gf.risk_level.value == "high" else 1,
+    # Test the subdivided pieces, not whole outlines, then map hits back to their geofence
+    hits = (
+        select(pts.c.i, models.GeofencePiece.geofence_id)
+        .join(
+            models.GeofencePiece,
+            func.ST_Intersects(models.GeofencePiece.geom, func.ST_SetSRID(func.ST_Point(pts.c.lng, pts.c.lat), 4326)),
         )
-        db.add(alert)
-        alerts_created.append(alert)
+        .distinct()
+        .subquery()
+    )
+    rows = db.query(hits.c.i, models.Geofence).join(
+        models.Geofence,
+        and_(models.Geofence.id == hits.c.geofence_id, models.Geofence.active == True),
+    ).order_by(hits.c.i, models.Geofence.id).all()
+    out = [[] for _ in points]
+    for i, gf in rows:
+        out[i].append(gf)
+    return out
+
+
+def _location_row(p: LocationIn) -> dict:
+    return {
+        "user_id": p.user_id,
+        "ts": _utc_naive(p.ts),
+        "position": _ewkt(p.lng, p.lat),
+        "speed": p.speed,
+        "source": models.LocationSource(p.source or "web"),
+    }
+
+
+async def _ingest(db: AsyncSession, points: list[LocationIn], write_behind: bool = False) -> list[list[AlertOut]]:
+    location_rows = [_location_row(p) for p in points]
+    if write_behind:
+        # Geofence evaluation and alerts stay synchronous; only the Location rows are deferred
+        try:
+            for row in location_rows:
+                if not location_writer.offer(row):
+                    # Queue full: wait for space off the event loop, bounded by LOCATION_ENQUEUE_TIMEOUT_MS
+                    await run_in_threadpool(location_writer.put, row)
+        except WriterFull:
+            raise HTTPException(status_code=503, detail="location queue full", headers={"Retry-After": "1"})
+    else:
+        await db.execute(insert(models.Location), location_rows)
+
+    matches = await _match_points(db, points)
+    out = [[] for _ in points]
+
+    # Occupancy: alerts fire on entry transitions only, so a ping inside an already known zone
+    # costs a dictionary lookup. Anonymous pings have no state and keep the dedup-only behaviour.
+    tracked = {p.user_id for p in points if p.user_id is not None}
+    states = await occupancy.load(db, tracked) if tracked else {}
+    entries, exits = [], []  # (point index, geofence, Stay or None) / (point index, geofence_id, Stay, exit time)
+    for i in sorted(range(len(points)), key=lambda i: _utc_naive(points[i].ts)):
+        p, gfs = points[i], matches[i]
+        if p.user_id is None:
+            entries.extend((i, gf, None) for gf in gfs)
+            continue
+        zones, ts = states[p.user_id], _utc_naive(p.ts)
+        current = {gf.id for gf in gfs}
+        for gid in [g for g in zones if g not in current]:
+            exits.append((i, gid, zones.pop(gid), ts))
+        for gf in gfs:
+            if gf.id not in zones:
+                zones[gf.id] = stay = Stay(ts)
+                entries.append((i, gf, stay))
+
+    if not entries and not exits:
+        await db.commit()
+        heatmap.record_pings((p.lng, p.lat, r["ts"]) for p, r in zip(points, location_rows))
+        return out
+
+    # Dedup: skip user+geofence pairs with a recent non-resolved alert (and repeats within this batch)
+    pairs = {(points[i].user_id, gf.id) for i, gf, _ in entries}
+    # The dedup helper takes a sync Session; run_sync drives it over the async connection
+    seen = await db.run_sync(alert_dedup.recent_open, pairs) if pairs else set()
+    rows, owners, risks, stays = [], [], [], []
+    for i, gf, stay in entries:
+        p = points[i]
+        if (p.user_id, gf.id) in seen:
+            continue
+        seen.add((p.user_id, gf.id))
+        risks.append(gf.risk_level)
+        rows.append({
+            "type": models.AlertType.geofence_breach,
+            "user_id": p.user_id,
+            "geofence_id": gf.id,
+            "location": _ewkt(p.lng, p.lat),
+            "severity": 2 if gf.risk_level.value == "high" else 1,
+            "details": {"location_ts": p.ts.isoformat()} if p.ts else None,
+        })
+        owners.append(i)
+        stays.append(stay)
+    events, alert_cells = [], []
+    if rows:
+        created = (await db.scalars(insert(models.Alert).returning(models.Alert, sort_by_parameter_order=True), rows)).all()
+        for i, a, risk, stay in zip(owners, created, risks, stays):
+            out[i].append(AlertOut.model_validate(a))
+            alert_cells.append((points[i].lng, points[i].lat, a.ts))
+            events.append(("alert.created", alert_event(a, risk, points[i].lng, points[i].lat)))
+            if stay is not None:
+                stay.alert_id = a.id
+
+    # Exits: record exit time and dwell on the entry alert, and tell stream subscribers
+    updates = []
+    for i, gid, stay, ts in exits:
+        dwell = max((ts - stay.entered_at).total_seconds(), 0.0)
+        if stay.alert_id is not None:
+            updates.append({"id": stay.alert_id, "patch": json.dumps({"exited_at": ts.isoformat(), "dwell_seconds": dwell})})
+        gf = geofence_index.get(gid)
+        events.append(("geofence.exit", {
+            "id": stay.alert_id,
+            "user_id": points[i].user_id,
+            "geofence_id": gid,
+            "entered_at": stay.entered_at.isoformat(),
+            "exited_at": ts.isoformat(),
+            "dwell_seconds": dwell,
+            "risk": gf.risk_level.value if gf else None,
+            "lng": points[i].lng,
+            "lat": points[i].lat,
+        }))
+    if updates:
+        await db.execute(ALERT_EXIT_SQL, updates)
+    await db.commit()
+    await occupancy.save(states)
+    alert_dedup.remember((r["user_id"], r["geofence_id"]) for r in rows)
+    heatmap.record_pings((p.lng, p.lat, r["ts"]) for p, r in zip(points, location_rows))
+    heatmap.record_alerts(alert_cells)
+    for kind, ev in events:
+        broker.publish(kind, ev)
+    return out
+
+
+async def _proximity_warnings(db: AsyncSession, p: LocationIn) -> list[dict]:
+    # Approaching, not inside: containment is already reported as a breach alert
+    hits = await nearby_async(
+        db, p.lng, p.lat, settings.PROXIMITY_WARN_RADIUS_M, settings.PROXIMITY_WARN_LIMIT + 1,
+        risks_from(settings.PROXIMITY_WARN_MIN_RISK),
+    )
+    return [h for h in hits if h["distance_m"] > 0][:settings.PROXIMITY_WARN_LIMIT]
+
+
+@router.post("/ingest", response_model=list[AlertOut] | IngestOut, dependencies=[Depends(require_roles(models.Role.tourist, models.Role.operator, models.Role.police, models.Role.admin))])
+async def ingest_location(
+    body: LocationIn,
+    warn: bool = Query(default=False, description="Return {alerts, nearby} with risky geofences within PROXIMITY_WARN_RADIUS_M"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    alerts = (await _ingest(db, [body], write_behind=settings.LOCATION_WRITE_BEHIND))[0]
+    if not warn:
+        return alerts
+    # Served from the in-process index when enabled, so warnings add no database round trip
+    return {"alerts": alerts, "nearby": await _proximity_warnings(db, body)}
+
+
+@router.post("/ingest/batch", response_model=list[PointAlertsOut], dependencies=[Depends(require_roles(models.Role.tourist, models.Role.operator, models.Role.police, models.Role.admin))])
+async def ingest_locations_batch(body: LocationBatchIn, db: AsyncSession = Depends(get_async_db)):
+    # Buffered offline uploads: one multi-row insert, one geofence join and one dedup query for the whole batch.
+    # Batches are already amortised, so they bypass the write-behind queue and keep it free for live pings.
+    if len(body.points) > settings.INGEST_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {settings.INGEST_BATCH_MAX} points per batch")
+    if not body.points:
+        return []
+    results = await _ingest(db, body.points)
+    return [{"index": i, "alerts": alerts} for i, alerts in enumerate(results) if alerts]
+
+
+@router.get("/{user_id}/occupancy", response_model=list[OccupancyOut], dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
+async def get_occupancy(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Geofences the user is currently inside, with how long they have been there
+    zones = (await occupancy.load(db, [user_id]))[user_id]
+    now = datetime.utcnow()
+    return [
+        {"geofence_id": gid, "entered_at": s.entered_at, "dwell_seconds": max((now - s.entered_at).total_seconds(), 0.0), "alert_id": s.alert_id}
+        for gid, s in sorted(zones.items())
+    ]
+
+
+def _track_points(user_id: int, start: datetime, end: datetime, tolerance: float):
+    # (lng, lat, ts or None) in time order. Memory is bounded by one chunk: rollups are
+    # read first, then raw pings after the last rolled-up day in TRACK_CHUNK_HOURS windows.
+    day_from = datetime(start.year, start.month, start.day)
+    with SessionLocal() as s:
+        last_day = None
+        for day, lng, lat in s.execute(
+            ROLLUP_TRACK_SQL, {"user_id": user_id, "day_from": day_from, "end": end, "tolerance": tolerance}
+        ).yield_per(1000):
+            last_day = day
+            yield lng, lat, None
+        if last_day is not None:
+            start = max(start, last_day + timedelta(days=1))
+        step = timedelta(hours=settings.TRACK_CHUNK_HOURS)
+        while start < end:
+            chunk_end = min(start + step, end)
+            for lng, lat, m in s.execute(
+                RAW_TRACK_SQL, {"user_id": user_id, "start": start, "end": chunk_end, "tolerance": tolerance}
+            ):
+                yield lng, lat, datetime.utcfromtimestamp(m)
+            start = chunk_end
+
+
+@router.get("/{user_id}/track", dependencies=[Depends(require_roles(models.Role.admin, models.Role.operator, models.Role.police))])
+def get_track(
+    user_id: int,
+    start: datetime | None = Query(default=None, alias="from", description="Start of the range (UTC); default 24h before `to`"),
+    end: datetime | None = Query(default=None, alias="to", description="End of the range (UTC); default now"),
+    tolerance: float | None = Query(default=None, ge=0, description="Simplification tolerance in degrees (default TRACK_DEFAULT_TOLERANCE)"),
+    format: str = Query(default="geojson", pattern="^(geojson|ndjson)$"),
+):
+    end = _utc_naive(end)
+    start = _utc_naive(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if tolerance is None:
+        tolerance = settings.TRACK_DEFAULT_TOLERANCE
+    points = _track_points(user_id, start, end, tolerance)
+
+    if format == "ndjson":
+        def lines():
+            buf = []
+            for lng, lat, ts in points:
+                buf.append(json.dumps({"lng": lng, "lat": lat, "ts": ts.isoformat() if ts else None}) + "\n")
+                if len(buf) == TRACK_WRITE_BATCH:
+                    yield "".join(buf)
+                    buf = []
+            yield "".join(buf)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-    db.commit()
-    # refresh ids
-    for a in alerts_created:
-        db.refresh(a)
+    def feature():
+        # One GeoJSON LineString Feature, written coordinate by coordinate
+        props = {"user_id": user_id, "from": start.isoformat(), "to": end.isoformat(), "tolerance": tolerance}
+        yield '{"type":"Feature","properties":%s,"geometry":{"type":"LineString","coordinates":[' % json.dumps(props)
+        buf, sep = [], ""
+        for lng, lat, _ in points:
+            buf.append(f"[{lng},{lat}]")
+            if len(buf) == TRACK_WRITE_BATCH:
+                # Separator goes before each chunk but the first, so no trailing comma is ever written
+                yield sep + ",".join(buf)
+                buf, sep = [], ","
+        yield (sep + ",".join(buf) if buf else "") + "]}}"
 
-    return alerts_created
+    return StreamingResponse(feature(), media_type="application/geo+json")
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..services.metrics import render
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Prometheus text exposition; counters are per worker process (scrape each worker or sum them)
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
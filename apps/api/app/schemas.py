@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
+from datetime import datetime
 from enum import Enum
 
 class Role(str, Enum):
@@ -20,6 +21,9 @@ class UserOut(BaseModel):
     class Config:
         from_attributes = True
 
+class RoleUpdate(BaseModel):
+    role: Role
+
 class TokenOut(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -40,15 +44,28 @@ class GeofenceOut(BaseModel):
     name: str
     risk_level: GeofenceRisk
     active: bool
+    # Set on create when a history backfill was started (poll GET /geofences/backfill/{job_id})
+    backfill_job_id: Optional[str] = None
     class Config:
         from_attributes = True
 
+class NearbyGeofenceOut(BaseModel):
+    id: int
+    name: str
+    risk_level: GeofenceRisk
+    distance_m: float
+
 class LocationIn(BaseModel):
     user_id: Optional[int] = None
     lat: float
     lng: float
     speed: Optional[int] = None
     source: Optional[str] = "web"
+    # Device fix time for buffered uploads; defaults to server receive time
+    ts: Optional[datetime] = None
+
+class LocationBatchIn(BaseModel):
+    points: List[LocationIn]
 
 class AlertOut(BaseModel):
     id: int
@@ -59,3 +76,41 @@ class AlertOut(BaseModel):
     status: str
     class Config:
         from_attributes = True
+
+class IngestOut(BaseModel):
+    alerts: List[AlertOut]
+    # Risky geofences close to (but not containing) the point; only when ?warn=true
+    nearby: List[NearbyGeofenceOut]
+
+class OccupancyOut(BaseModel):
+    geofence_id: int
+    entered_at: datetime
+    dwell_seconds: float
+    alert_id: Optional[int] = None
+
+class AlertListOut(BaseModel):
+    id: int
+    type: str
+    user_id: Optional[int]
+    geofence_id: Optional[int]
+    severity: Optional[int]
+    status: Optional[str]
+    ts: Optional[datetime]
+
+class AlertBulkIn(BaseModel):
+    # Alerts matching every given criterion; at least one is required
+    ids: Optional[List[int]] = None
+    geofence_id: Optional[int] = None
+    older_than_minutes: Optional[int] = None
+    min_severity: Optional[int] = None
+    max_severity: Optional[int] = None
+
+class AlertBulkOut(BaseModel):
+    status: str
+    count: int
+    ids: List[int]
+
+class PointAlertsOut(BaseModel):
+    # index of the point in LocationBatchIn.points
+    index: int
+    alerts: List[AlertOut]
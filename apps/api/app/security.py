@@ -17,7 +17,11 @@ def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
 
-def create_access_token(subject: str, expires_minutes: int = ACCESS_MIN) -> str:
-    expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    to_encode = {"sub": subject, "exp": expire}
+def create_access_token(subject: str, expires_minutes: int = ACCESS_MIN, role: Optional[str] = None) -> str:
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=expires_minutes)
+    to_encode = {"sub": subject, "exp": expire, "iat": now}
+    if role:
+        # Lets get_current_user authorise without a user lookup (see JWT_ROLE_CLAIM)
+        to_encode["role"] = role
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=ALGO)
@@ -0,0 +1,116 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.config import settings
+from ..db import SessionLocal
+from .dedup import alert_dedup
+from .live import broker
+
+log = logging.getLogger(__name__)
+
+# Statuses a bulk transition moves alerts out of; alerts already there (or further along) are left alone
+SOURCES = {
+    models.AlertStatus.ack: (models.AlertStatus.new,),
+    models.AlertStatus.resolved: (models.AlertStatus.new, models.AlertStatus.ack),
+}
+
+# One batch of stale open alerts. The inner scan is a range on ix_alerts_status_ts_id and stops at
+# :batch rows; SKIP LOCKED passes over rows an operator is updating instead of waiting on them.
+SWEEP_SQL = text(
+    """
+    UPDATE alerts a
+    SET status = 'resolved',
+        details = (COALESCE(a.details::jsonb, '{}'::jsonb) || jsonb_build_object('auto_resolved_at', CAST(:now AS text)))::json
+    FROM (
+        SELECT id FROM alerts
+        WHERE status IN ('new', 'ack') AND ts < :cutoff
+        LIMIT :batch
+        FOR UPDATE SKIP LOCKED
+    ) s
+    WHERE a.id = s.id
+    RETURNING a.id, a.user_id, a.geofence_id, a.type
+    """
+)
+
+
+def transition(db: Session, status: models.AlertStatus, *criteria) -> list:
+    """Move every alert matching criteria to status with one UPDATE ... RETURNING; the caller commits."""
+    stmt = (
+        update(models.Alert)
+        .where(models.Alert.status.in_(SOURCES[status]), *criteria)
+        .values(status=status)
+        .returning(models.Alert.id, models.Alert.user_id, models.Alert.geofence_id, models.Alert.type)
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(stmt).all()
+
+
+def announce(rows, status: models.AlertStatus, reason: str | None = None) -> None:
+    # After commit: drop dedup entries of resolved breaches and publish a single stream event
+    # for the whole batch (clients refetch rather than receive one event per alert)
+    if not rows:
+        return
+    if status == models.AlertStatus.resolved:
+        for r in rows:
+            if r.type == models.AlertType.geofence_breach:
+                alert_dedup.invalidate(r.user_id, r.geofence_id)
+    broker.publish("alert.bulk_updated", {
+        "status": status.value,
+        "count": len(rows),
+        "ids": [r.id for r in rows],
+        "reason": reason,
+    })
+
+
+def sweep(now: datetime | None = None) -> int:
+    """Resolve open alerts older than ALERT_AUTO_RESOLVE_HOURS, ALERT_SWEEP_BATCH rows per transaction."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.ALERT_AUTO_RESOLVE_HOURS)
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(SWEEP_SQL, {"now": now.isoformat(), "cutoff": cutoff, "batch": settings.ALERT_SWEEP_BATCH}).all()
+            db.commit()
+        announce(rows, models.AlertStatus.resolved, "auto")
+        total += len(rows)
+        if len(rows) < settings.ALERT_SWEEP_BATCH:
+            return total
+
+
+class AlertSweeper:
+    """Background thread auto-resolving stale alerts every interval seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if settings.ALERT_AUTO_RESOLVE_HOURS <= 0 or self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                n = sweep()
+                if n:
+                    log.info("auto-resolved %d stale alerts", n)
+            except Exception:
+                log.exception("alert sweep failed")
+
+
+alert_sweeper = AlertSweeper(settings.ALERT_SWEEP_INTERVAL_SECONDS)
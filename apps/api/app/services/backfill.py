@@ -0,0 +1,90 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, text
+
+from ..core.config import settings
+from ..db import SessionLocal
+from .dedup import alert_dedup
+from .heatmap import heatmap
+from .jobs import Job, jobs
+from .live import broker
+
+log = logging.getLogger(__name__)
+
+# Latest sighting per (user, geofence) inside one time chunk, turned into breach alerts unless the
+# pair already has an open one. Pings are read from the chunk's partitions only, narrowed to each
+# geofence's stored bounding box (an index probe on locations.position instead of a scan of the
+# chunk) and only then matched against the subdivided pieces; anonymous pings are skipped, there
+# is nobody to warn.
+BACKFILL_SQL = text(
+    """
+    WITH hits AS (
+        SELECT DISTINCT ON (l.user_id, b.id) l.user_id, b.id AS geofence_id, l.ts, l.position
+        FROM geofences b
+        JOIN locations l ON l.position && ST_MakeEnvelope(b.min_lng, b.min_lat, b.max_lng, b.max_lat, 4326)
+        WHERE b.id IN :gids AND l.ts >= :lo AND l.ts < :hi AND l.user_id IS NOT NULL
+          AND EXISTS (
+              SELECT 1 FROM geofence_pieces p WHERE p.geofence_id = b.id AND ST_Intersects(p.geom, l.position)
+          )
+        ORDER BY l.user_id, b.id, l.ts DESC
+    )
+    INSERT INTO alerts (type, user_id, geofence_id, ts, location, severity, status, details)
+    SELECT 'geofence_breach', h.user_id, h.geofence_id, :now, h.position,
+           CASE WHEN g.risk_level = 'high' THEN 2 ELSE 1 END, 'new',
+           json_build_object('location_ts', h.ts, 'backfill_job', CAST(:job AS text))
+    FROM hits h
+    JOIN geofences g ON g.id = h.geofence_id AND g.active
+    WHERE NOT EXISTS (
+        SELECT 1 FROM alerts a
+        WHERE a.user_id = h.user_id AND a.geofence_id = h.geofence_id
+          AND a.type = 'geofence_breach' AND a.status != 'resolved'
+    )
+    RETURNING id, user_id, geofence_id, ST_X(location) AS lng, ST_Y(location) AS lat
+    """
+).bindparams(bindparam("gids", expanding=True))
+
+
+def chunks(start: datetime, end: datetime, step: timedelta) -> list[tuple[datetime, datetime]]:
+    # Newest first: a user seen in several chunks gets one alert, for their latest sighting
+    out = []
+    hi = end
+    while hi > start:
+        lo = max(hi - step, start)
+        out.append((lo, hi))
+        hi = lo
+    return out
+
+
+def backfill_geofences(job: Job, geofence_ids: list[int], hours: float) -> None:
+    """Raise breach alerts for users whose recent pings fall inside the given geofences.
+
+    Each chunk is its own short transaction that only reads locations and inserts alerts, so live
+    ingest is never blocked; cancellation takes effect between chunks.
+    """
+    now = datetime.utcnow()
+    windows = chunks(now - timedelta(hours=hours), now, timedelta(minutes=settings.GEOFENCE_BACKFILL_CHUNK_MINUTES))
+    job.total = len(windows)
+    for lo, hi in windows:
+        if job.cancel_requested:
+            return
+        with SessionLocal() as db:
+            rows = db.execute(BACKFILL_SQL, {"gids": geofence_ids, "lo": lo, "hi": hi, "now": now, "job": job.id}).all()
+            db.commit()
+        job.processed += 1
+        if not rows:
+            continue
+        job.created += len(rows)
+        alert_dedup.remember((r.user_id, r.geofence_id) for r in rows)
+        heatmap.record_alerts((r.lng, r.lat, now) for r in rows)
+        broker.publish("alert.bulk_created", {"count": len(rows), "ids": [r.id for r in rows], "reason": "backfill"})
+    log.info("backfill %s: %d alerts for geofences %s", job.id, job.created, geofence_ids)
+
+
+def submit(geofence_ids: list[int], hours: float | None = None) -> Job | None:
+    # Starts a backfill job over the last `hours` (default GEOFENCE_BACKFILL_HOURS); None when disabled
+    hours = settings.GEOFENCE_BACKFILL_HOURS if hours is None else hours
+    hours = min(hours, settings.GEOFENCE_BACKFILL_MAX_HOURS)
+    if hours <= 0 or not geofence_ids:
+        return None
+    return jobs.submit("backfill_geofences", backfill_geofences, list(geofence_ids), hours)
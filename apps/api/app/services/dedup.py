@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, tuple_, and_, or_
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.config import settings
+from .cache import TTLCache
+
+DEDUP_WINDOW = timedelta(minutes=5)
+
+
+class AlertDedup:
+    """Remembers (user_id, geofence_id) pairs that have a recent open breach alert.
+
+    An entry lives only for the rest of the dedup window of the alert it stands for, so a
+    stale entry can never suppress alerts for longer than the window itself.
+    """
+
+    def __init__(self, maxsize: int, window: timedelta = DEDUP_WINDOW):
+        self.window = window
+        self._cache = TTLCache(maxsize, window.total_seconds())
+
+    def recent_open(self, db: Session, pairs: set[tuple]) -> set[tuple]:
+        hits = {k for k in pairs if self._cache.get(k)}
+        missing = pairs - hits
+        if not missing:
+            return hits
+        now = datetime.utcnow()
+        for key, last_ts in _latest_open(db, missing, now - self.window).items():
+            self._cache.set(key, True, ttl=(last_ts + self.window - now).total_seconds())
+            hits.add(key)
+        return hits
+
+    def remember(self, pairs) -> None:
+        for key in pairs:
+            self._cache.set(key, True)
+
+    def invalidate(self, user_id: int | None, geofence_id: int | None) -> None:
+        self._cache.pop((user_id, geofence_id))
+
+
+def _latest_open(db: Session, pairs: set[tuple], window_start: datetime) -> dict[tuple, datetime]:
+    # One query for every pair; served by the partial ix_alerts_open_breach index
+    known = [(u, g) for u, g in pairs if u is not None]
+    anon = [g for u, g in pairs if u is None]
+    conds = []
+    if known:
+        conds.append(tuple_(models.Alert.user_id, models.Alert.geofence_id).in_(known))
+    if anon:
+        conds.append(and_(models.Alert.user_id.is_(None), models.Alert.geofence_id.in_(anon)))
+    rows = db.query(models.Alert.user_id, models.Alert.geofence_id, func.max(models.Alert.ts)).filter(
+        models.Alert.type == models.AlertType.geofence_breach,
+        models.Alert.ts >= window_start,
+        models.Alert.status != models.AlertStatus.resolved,
+        or_(*conds),
+    ).group_by(models.Alert.user_id, models.Alert.geofence_id).all()
+    return {(u, g): ts for u, g, ts in rows}
+
+
+alert_dedup = AlertDedup(settings.ALERT_DEDUP_CACHE_SIZE)
@@ -0,0 +1,128 @@
+import threading
+from dataclasses import dataclass
+
+from ..core.config import settings
+from .cache import TTLCache
+
+# Minimal ABI for DigitalIDRegistry.get(bytes32) -> (bytes32 idHash, address issuer, uint8 status)
+ABI = [
+    {
+        "inputs": [{"internalType": "bytes32", "name": "idHash", "type": "bytes32"}],
+        "name": "get",
+        "outputs": [
+            {"internalType": "bytes32", "name": "idHash", "type": "bytes32"},
+            {"internalType": "address", "name": "issuer", "type": "address"},
+            {"internalType": "uint8", "name": "status", "type": "uint8"},
+        ],
+        "stateMutability": "view",
+        "type": "function",
+    }
+]
+
+
+@dataclass(frozen=True)
+class Verification:
+    found: bool
+    issuer: str | None = None
+    status: int | None = None
+
+
+def normalise_hash(id_hash: str) -> str:
+    # accept hex string with or without 0x; must be exactly 32 bytes
+    h = id_hash.lower()
+    h = h if h.startswith("0x") else "0x" + h
+    if len(h) != 66 or any(c not in "0123456789abcdef" for c in h[2:]):
+        raise ValueError("id_hash must be 32 bytes of hex")
+    return h
+
+
+def _verification(result) -> Verification:
+    # If idHash is zero, treat as not found
+    if not any(int(b) != 0 for b in result[0]):
+        return Verification(found=False)
+    return Verification(found=True, issuer=result[1], status=int(result[2]))
+
+
+class DigitalIDClient:
+    """Long-lived registry client: one Web3 instance, pooled HTTP connections, and a result cache.
+
+    Any Web3 provider works, so tests can pass Web3(EthereumTesterProvider()) or an anvil URL.
+    web3 is imported on first use only: it is by far the slowest import in the API.
+    """
+
+    def __init__(self, w3, address: str):
+        from web3 import Web3
+
+        self.w3 = w3
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=ABI)
+        # Negative results are cached too, for a shorter time, so unknown ids don't hammer the node
+        self.cache = TTLCache(settings.DIGITAL_ID_CACHE_SIZE, settings.DIGITAL_ID_CACHE_TTL)
+
+    @classmethod
+    def from_settings(cls) -> "DigitalIDClient":
+        import requests
+        from requests.adapters import HTTPAdapter
+        from web3 import Web3
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RPC_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        provider = Web3.HTTPProvider(
+            settings.POLYGON_RPC_URL,
+            request_kwargs={"timeout": settings.RPC_TIMEOUT_SECONDS},
+            session=session,
+            # Fail fast: a slow or flaky node surfaces as an error instead of tying up workers with retries
+            exception_retry_configuration=None,
+        )
+        return cls(Web3(provider), settings.CONTRACT_ADDRESS)
+
+    def verify(self, id_hash: str) -> Verification:
+        return self.verify_many([id_hash])[0]
+
+    def verify_many(self, id_hashes: list[str]) -> list[Verification]:
+        keys = [normalise_hash(h) for h in id_hashes]
+        results = {k: self.cache.get(k) for k in keys}
+        missing = [k for k, v in results.items() if v is None]
+        for i in range(0, len(missing), settings.RPC_BATCH_SIZE):
+            chunk = missing[i:i + settings.RPC_BATCH_SIZE]
+            for key, v in zip(chunk, self._call(chunk)):
+                self.cache.set(key, v, ttl=None if v.found else settings.DIGITAL_ID_NEGATIVE_TTL)
+                results[key] = v
+        return [results[k] for k in keys]
+
+    def _call(self, keys: list[str]) -> list[Verification]:
+        from hexbytes import HexBytes
+
+        calls = [self.contract.functions.get(HexBytes(k)) for k in keys]
+        if len(calls) == 1:
+            return [_verification(calls[0].call())]
+        try:
+            # One JSON-RPC batch request for the whole chunk
+            with self.w3.batch_requests() as batch:
+                for c in calls:
+                    batch.add(c)
+                raw = batch.execute()
+        except NotImplementedError:
+            # Providers without batch support (e.g. some test providers)
+            raw = [c.call() for c in calls]
+        return [_verification(r) for r in raw]
+
+
+_client: DigitalIDClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> DigitalIDClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DigitalIDClient.from_settings()
+    return _client
+
+
+def set_client(client: DigitalIDClient | None) -> None:
+    # Swap in a client bound to a local chain (eth-tester/anvil) for tests
+    global _client
+    _client = client
@@ -0,0 +1,223 @@
+import asyncio
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import shapely
+from shapely import STRtree
+from shapely.geometry import Point
+from shapely.geometry.base import BaseGeometry
+from geoalchemy2.shape import to_shape
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.config import settings
+from ..db import SessionLocal
+
+VERSION_KEY = "geofences"
+# Mean metres per degree of latitude
+METRES_PER_DEGREE = 111_320.0
+
+
+@dataclass(frozen=True)
+class IndexedGeofence:
+    id: int
+    name: str
+    risk_level: models.GeofenceRisk
+    active: bool
+    geom: BaseGeometry
+
+
+VERSION_SELECT = select(models.CacheVersion.version).where(models.CacheVersion.name == VERSION_KEY)
+
+
+def read_version(db: Session) -> int:
+    return db.execute(VERSION_SELECT).scalar() or 0
+
+
+async def read_version_async(db: AsyncSession) -> int:
+    return (await db.execute(VERSION_SELECT)).scalar() or 0
+
+
+def bump_version(db: Session) -> int:
+    # Runs inside the caller's transaction so the new version becomes visible together with the change
+    stmt = (
+        pg_insert(models.CacheVersion)
+        .values(name=VERSION_KEY, version=1)
+        .on_conflict_do_update(
+            index_elements=[models.CacheVersion.name],
+            set_={"version": models.CacheVersion.version + 1},
+        )
+        .returning(models.CacheVersion.version)
+    )
+    return db.execute(stmt).scalar_one()
+
+
+class GeofenceIndex:
+    """STRtree over prepared geofence polygons, kept in sync with the geofences table via a shared version."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[int, IndexedGeofence] = {}
+        # (tree, entries by tree position) swapped atomically so readers never take the lock
+        self._snapshot: tuple[STRtree | None, list[IndexedGeofence]] = (None, [])
+        self.version = -1
+        self._checked_at = 0.0
+        self._listeners = []
+
+    @property
+    def loaded(self) -> bool:
+        return self.version >= 0
+
+    def add_listener(self, fn) -> None:
+        # fn(bounds) after the indexed geofences change; bounds lists the (minx, miny, maxx, maxy)
+        # of every old and new shape touched, or is None when anything may have changed
+        self._listeners.append(fn)
+
+    def get(self, gid: int) -> IndexedGeofence | None:
+        return self._entries.get(gid)
+
+    def entries(self) -> list[IndexedGeofence]:
+        return list(self._entries.values())
+
+    def load(self, db: Session) -> None:
+        version = read_version(db)
+        rows = db.query(
+            models.Geofence.id,
+            models.Geofence.name,
+            models.Geofence.risk_level,
+            models.Geofence.active,
+            models.Geofence.area,
+        ).all()
+        entries = {}
+        for gid, name, risk, active, area in rows:
+            if area is None:
+                continue
+            entries[gid] = IndexedGeofence(gid, name, risk, bool(active), to_shape(area))
+        with self._lock:
+            bounds = _changed_bounds(self._entries, entries) if self.loaded else None
+            self._entries = entries
+            self._rebuild()
+            self.version = version
+            self._checked_at = time.monotonic()
+        if bounds != []:
+            self._notify(bounds)
+
+    def ensure_fresh(self, db: Session) -> None:
+        # Cheap version probe at most every GEOFENCE_INDEX_REFRESH_SECONDS; reload only if another worker changed the table
+        now = time.monotonic()
+        if self.loaded and now - self._checked_at < settings.GEOFENCE_INDEX_REFRESH_SECONDS:
+            return
+        self._checked_at = now
+        if read_version(db) != self.version:
+            self.load(db)
+
+    async def ensure_fresh_async(self, db: AsyncSession) -> None:
+        # Same probe for async routes; the reload (every shape plus the STRtree) runs in a worker
+        # thread with its own session so it never stalls the event loop
+        now = time.monotonic()
+        if self.loaded and now - self._checked_at < settings.GEOFENCE_INDEX_REFRESH_SECONDS:
+            return
+        self._checked_at = now
+        if await read_version_async(db) != self.version:
+            await asyncio.to_thread(self._reload)
+
+    def _reload(self) -> None:
+        with SessionLocal() as db:
+            self.load(db)
+
+    def apply(self, version: int, upserted: list[IndexedGeofence] = (), removed: list[int] = ()) -> None:
+        # Patch after a local commit. If a change from another worker was skipped in between,
+        # keep the old version so the next ensure_fresh() does a full reload.
+        with self._lock:
+            entries = dict(self._entries)
+            for e in upserted:
+                entries[e.id] = e
+            for gid in removed:
+                entries.pop(gid, None)
+            bounds = _changed_bounds(self._entries, entries)
+            self._entries = entries
+            self._rebuild()
+            if self.version == version - 1:
+                self.version = version
+            else:
+                self._checked_at = 0.0
+        self._notify(bounds)
+
+    def match(self, lng: float, lat: float) -> list[IndexedGeofence]:
+        tree, items = self._snapshot
+        if tree is None:
+            return []
+        pt = Point(lng, lat)
+        hits = [items[i] for i in tree.query(pt) if items[i].geom.intersects(pt)]
+        hits.sort(key=lambda e: e.id)
+        return hits
+
+    def match_many(self, lngs: list[float], lats: list[float]) -> list[list[IndexedGeofence]]:
+        # Vectorised join: bbox candidates from the tree, then one intersects() pass over all pairs
+        out = [[] for _ in lngs]
+        tree, items = self._snapshot
+        if tree is None or not out:
+            return out
+        pts = shapely.points(lngs, lats)
+        pt_idx, tree_idx = tree.query(pts)
+        mask = shapely.intersects(tree.geometries[tree_idx], pts[pt_idx])
+        for i, j in zip(pt_idx[mask].tolist(), tree_idx[mask].tolist()):
+            out[i].append(items[j])
+        for hits in out:
+            hits.sort(key=lambda e: e.id)
+        return out
+
+    def nearby(self, lng: float, lat: float, radius_m: float, limit: int, risks=None) -> list[tuple[IndexedGeofence, float]]:
+        # (geofence, metres) within radius_m, nearest first. Distances are measured in a local
+        # equirectangular projection around the point, accurate to well under 1% at these radii.
+        tree, items = self._snapshot
+        if tree is None:
+            return []
+        kx = METRES_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01)
+        d = radius_m / kx  # degrees of longitude, the wider axis, so the box covers the whole circle
+        cand = tree.query(shapely.box(lng - d, lat - d, lng + d, lat + d))
+        if risks is not None:
+            cand = np.array([i for i in cand.tolist() if items[i].risk_level in risks], dtype=np.intp)
+        if len(cand) == 0:
+            return []
+        origin = np.array([lng, lat])
+        scale = np.array([kx, METRES_PER_DEGREE])
+        local = shapely.transform(tree.geometries[cand], lambda c: (c - origin) * scale)
+        dist = shapely.distance(local, shapely.points(0.0, 0.0))
+        keep = dist <= radius_m
+        order = np.argsort(dist[keep], kind="stable")[:limit]
+        hits, dists = cand[keep][order], dist[keep][order]
+        return [(items[i], float(m)) for i, m in zip(hits.tolist(), dists.tolist())]
+
+    def _notify(self, bounds) -> None:
+        for fn in self._listeners:
+            fn(bounds)
+
+    def _rebuild(self) -> None:
+        items = [e for e in self._entries.values() if e.active]
+        if not items:
+            self._snapshot = (None, [])
+            return
+        geoms = [e.geom for e in items]
+        shapely.prepare(geoms)
+        self._snapshot = (STRtree(geoms), items)
+
+
+def _changed_bounds(old: dict[int, IndexedGeofence], new: dict[int, IndexedGeofence]) -> list[tuple]:
+    bounds = []
+    for gid in old.keys() | new.keys():
+        a, b = old.get(gid), new.get(gid)
+        if a is not None and b is not None and a.active == b.active and a.name == b.name \
+                and a.risk_level == b.risk_level and a.geom.equals_exact(b.geom, 0):
+            continue
+        bounds.extend(e.geom.bounds for e in (a, b) if e is not None)
+    return bounds
+
+
+geofence_index = GeofenceIndex()
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import math
+import threading
+
+from geoalchemy2.shape import to_shape
+from shapely.geometry import mapping
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.config import settings
+from ..db import SessionLocal
+from .geofence_index import IndexedGeofence, geofence_index, read_version
+
+MAX_ZOOM = 22
+FULL_PRECISION = 9  # ST_AsGeoJSON default
+
+
+def zoom_for_tolerance(tolerance: float) -> int:
+    # Snap an arbitrary tolerance (degrees) to the web-mercator zoom whose pixel size is closest
+    z = round(math.log2(360.0 / (256 * tolerance)))
+    return min(max(z, 0), MAX_ZOOM)
+
+
+def _pixel_deg(zoom: int) -> float:
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def _ring(coords, ndigits: int) -> list:
+    return [[round(x, ndigits), round(y, ndigits)] for x, y, *_ in coords]
+
+
+def _geometry(geom, ndigits: int) -> dict:
+    if geom.geom_type == "Polygon":
+        return {"type": "Polygon", "coordinates": [_ring(r.coords, ndigits) for r in (geom.exterior, *geom.interiors)]}
+    if geom.geom_type == "MultiPolygon":
+        return {"type": "MultiPolygon", "coordinates": [_geometry(p, ndigits)["coordinates"] for p in geom.geoms]}
+    return mapping(geom)
+
+
+def build_feature_collection(entries: list[IndexedGeofence], zoom: int | None) -> bytes:
+    if zoom is None:
+        tolerance, ndigits = 0.0, FULL_PRECISION
+    else:
+        # Simplify to about one pixel and keep only the decimals that pixel can show
+        tolerance = _pixel_deg(zoom)
+        ndigits = max(0, math.ceil(-math.log10(tolerance))) + 1
+    features = []
+    for e in sorted(entries, key=lambda e: e.id):
+        geom = e.geom
+        if tolerance:
+            simplified = geom.simplify(tolerance, preserve_topology=True)
+            # Zones smaller than a pixel keep their original shape so they stay visible
+            if not simplified.is_empty:
+                geom = simplified
+        features.append({
+            "type": "Feature",
+            "geometry": _geometry(geom, ndigits),
+            "properties": {
+                "id": e.id,
+                "name": e.name,
+                "risk_level": e.risk_level.value if hasattr(e.risk_level, "value") else str(e.risk_level),
+            },
+        })
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode()
+
+
+class GeoJSONCache:
+    """Serialised FeatureCollections per zoom variant, valid for one geofence-table version."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._variants: dict[int | None, tuple[str, bytes]] = {}
+        self._generation = 0
+        # Source rows when the in-process index is disabled
+        self._entries: list[IndexedGeofence] = []
+        self._version = -1
+
+    def invalidate(self, bounds=None) -> None:
+        with self._lock:
+            self._variants = {}
+            self._generation += 1
+
+    def get(self, db: Session, zoom: int | None) -> tuple[str, bytes]:
+        generation, entries = self._source(db)
+        variant = self._variants.get(zoom)
+        if variant is not None:
+            return variant
+        return self._build(generation, entries, zoom)
+
+    async def get_async(self, db: AsyncSession, zoom: int | None) -> tuple[str, bytes]:
+        # For async routes: hits cost one version probe; serialising a miss (and, without the
+        # index, reloading the table) runs in a worker thread instead of on the event loop
+        if not settings.GEOFENCE_INDEX_ENABLED:
+            return await asyncio.to_thread(self._get_own_session, zoom)
+        await geofence_index.ensure_fresh_async(db)
+        generation = self._generation
+        entries = geofence_index.entries()
+        variant = self._variants.get(zoom)
+        if variant is not None:
+            return variant
+        return await asyncio.to_thread(self._build, generation, entries, zoom)
+
+    def _get_own_session(self, zoom: int | None) -> tuple[str, bytes]:
+        with SessionLocal() as db:
+            return self.get(db, zoom)
+
+    def _build(self, generation: int, entries: list[IndexedGeofence], zoom: int | None) -> tuple[str, bytes]:
+        body = build_feature_collection(entries, zoom)
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        with self._lock:
+            # Don't store a variant built from entries that were replaced while we worked
+            if generation == self._generation:
+                self._variants[zoom] = (etag, body)
+        return etag, body
+
+    def _source(self, db: Session) -> tuple[int, list[IndexedGeofence]]:
+        # The generation is read before the entries it vouches for: a change landing in between
+        # bumps it, so the variant built from those entries is not stored
+        if settings.GEOFENCE_INDEX_ENABLED:
+            # Index reloads/patches call invalidate() through its listener
+            geofence_index.ensure_fresh(db)
+            generation = self._generation
+            return generation, geofence_index.entries()
+        version = read_version(db)
+        if version != self._version:
+            rows = db.query(
+                models.Geofence.id, models.Geofence.name, models.Geofence.risk_level, models.Geofence.active, models.Geofence.area
+            ).all()
+            self._entries = [IndexedGeofence(gid, n, r, bool(a), to_shape(area)) for gid, n, r, a, area in rows if area is not None]
+            self._version = version
+            self.invalidate()
+        generation = self._generation
+        return generation, self._entries
+
+
+geojson_cache = GeoJSONCache()
+geofence_index.add_listener(geojson_cache.invalidate)
@@ -0,0 +1,56 @@
+import shapely
+from shapely.geometry import MultiPolygon
+from shapely.geometry.base import BaseGeometry
+from sqlalchemy import bindparam, text
+
+from ..core.config import settings
+
+DELETE_PIECES_SQL = text("DELETE FROM geofence_pieces WHERE geofence_id IN :ids").bindparams(
+    bindparam("ids", expanding=True)
+)
+
+INSERT_PIECES_SQL = text(
+    """
+    INSERT INTO geofence_pieces (geofence_id, geom)
+    SELECT id, ST_Subdivide(area, :max_vertices) FROM geofences WHERE id IN :ids
+    """
+).bindparams(bindparam("ids", expanding=True))
+
+BBOX_SQL = text(
+    """
+    UPDATE geofences SET min_lng = ST_XMin(area), min_lat = ST_YMin(area), max_lng = ST_XMax(area), max_lat = ST_YMax(area)
+    WHERE id IN :ids
+    """
+).bindparams(bindparam("ids", expanding=True))
+
+
+def repair(geom: BaseGeometry) -> BaseGeometry:
+    """Valid polygonal version of geom, or ValueError when it has no area at all.
+
+    make_valid() keeps every area a self-intersecting ring encloses (possibly as a MultiPolygon);
+    the stray lines and points it can also produce are dropped. Same algorithm as ST_MakeValid,
+    so the in-process index and PostGIS agree on the shape.
+    """
+    if geom.is_valid and not geom.is_empty:
+        return geom
+    polys = []
+    for part in shapely.get_parts(shapely.make_valid(geom)).tolist():
+        if part.geom_type == "Polygon":
+            polys.append(part)
+        elif part.geom_type == "MultiPolygon":
+            polys.extend(part.geoms)
+    polys = [p for p in polys if not p.is_empty]
+    if not polys:
+        raise ValueError("polygon has no area")
+    return polys[0] if len(polys) == 1 else MultiPolygon(polys)
+
+
+def write_pieces(db, ids) -> None:
+    # Refresh the bbox columns and geofence_pieces rows of these geofences from their stored area.
+    # Runs inside the caller's transaction (Session or Connection), next to the geofence write.
+    ids = list(ids)
+    if not ids:
+        return
+    db.execute(BBOX_SQL, {"ids": ids})
+    db.execute(DELETE_PIECES_SQL, {"ids": ids})
+    db.execute(INSERT_PIECES_SQL, {"ids": ids, "max_vertices": settings.GEOFENCE_SUBDIVIDE_MAX_VERTICES})
@@ -0,0 +1,155 @@
+import logging
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .. import models
+from ..core.config import settings
+from ..db import engine
+
+log = logging.getLogger(__name__)
+
+TABLE = models.HeatmapCell.__table__
+
+# Seeds heatmap_cells from the raw tables for one level; used once by the migration that adds them
+REBUILD_PINGS_SQL = text(
+    """
+    INSERT INTO heatmap_cells (level, hour, cell_x, cell_y, pings, alerts)
+    SELECT :level, date_trunc('hour', ts), floor((ST_X(position) + 180) / :size)::int,
+           floor((ST_Y(position) + 90) / :size)::int, count(*), 0
+    FROM locations
+    GROUP BY 2, 3, 4
+    ON CONFLICT (level, hour, cell_x, cell_y) DO UPDATE SET pings = heatmap_cells.pings + EXCLUDED.pings
+    """
+)
+
+REBUILD_ALERTS_SQL = text(
+    """
+    INSERT INTO heatmap_cells (level, hour, cell_x, cell_y, pings, alerts)
+    SELECT :level, date_trunc('hour', ts), floor((ST_X(location) + 180) / :size)::int,
+           floor((ST_Y(location) + 90) / :size)::int, 0, count(*)
+    FROM alerts
+    WHERE location IS NOT NULL AND ts IS NOT NULL
+    GROUP BY 2, 3, 4
+    ON CONFLICT (level, hour, cell_x, cell_y) DO UPDATE SET alerts = heatmap_cells.alerts + EXCLUDED.alerts
+    """
+)
+
+
+def levels() -> list[int]:
+    return sorted({int(v) for v in settings.HEATMAP_LEVELS.split(",") if v.strip()})
+
+
+def cell_size(level: int) -> float:
+    return 360.0 / 2 ** level
+
+
+def cell(lng: float, lat: float, level: int) -> tuple[int, int]:
+    size = cell_size(level)
+    return math.floor((lng + 180.0) / size), math.floor((lat + 90.0) / size)
+
+
+def hour_of(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def rebuild(conn) -> None:
+    # Counts every ping and alert still in the database into the configured levels
+    for level in levels():
+        params = {"level": level, "size": cell_size(level)}
+        conn.execute(REBUILD_PINGS_SQL, params)
+        conn.execute(REBUILD_ALERTS_SQL, params)
+
+
+class HeatmapAggregator:
+    """Per-process pending counts per (level, hour, cell), merged into heatmap_cells every flush interval.
+
+    Each worker adds its own deltas (ON CONFLICT ... SET pings = pings + excluded.pings), so any
+    number of processes can count into the same cells. Counts not yet flushed are lost if the
+    process dies; a clean shutdown flushes them.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.levels = levels()
+        self._pending: defaultdict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _record(self, items, slot: int) -> None:
+        if not settings.HEATMAP_ENABLED:
+            return
+        keys = []
+        for lng, lat, ts in items:
+            hour = hour_of(ts)
+            keys.extend((level, hour, *cell(lng, lat, level)) for level in self.levels)
+        with self._lock:
+            for key in keys:
+                self._pending[key][slot] += 1
+
+    def record_pings(self, items) -> None:
+        # items: (lng, lat, naive UTC ts)
+        self._record(items, 0)
+
+    def record_alerts(self, items) -> None:
+        self._record(items, 1)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+        if not pending:
+            return 0
+        # Sorted so concurrent flushes from several workers take row locks in the same order
+        rows = [
+            {"level": k[0], "hour": k[1], "cell_x": k[2], "cell_y": k[3], "pings": v[0], "alerts": v[1]}
+            for k, v in sorted(pending.items())
+        ]
+        stmt = pg_insert(TABLE)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TABLE.c.level, TABLE.c.hour, TABLE.c.cell_x, TABLE.c.cell_y],
+            set_={"pings": TABLE.c.pings + stmt.excluded.pings, "alerts": TABLE.c.alerts + stmt.excluded.alerts},
+        )
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt, rows)
+        except Exception:
+            # Put the counts back so the next flush retries them
+            with self._lock:
+                for k, v in pending.items():
+                    cur = self._pending[k]
+                    cur[0] += v[0]
+                    cur[1] += v[1]
+            raise
+        return len(rows)
+
+    def start(self) -> None:
+        if not settings.HEATMAP_ENABLED or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="heatmap-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            log.exception("final heatmap flush failed")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("heatmap flush failed")
+
+
+heatmap = HeatmapAggregator(settings.HEATMAP_FLUSH_SECONDS)
@@ -0,0 +1,129 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from shapely.geometry import Polygon
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .. import models
+from ..db import SessionLocal
+from ..core.config import settings
+from ..security import hash_password
+from .geofence_index import IndexedGeofence, bump_version, geofence_index
+from .geometry import repair, write_pieces
+from . import backfill
+from .jobs import Job
+
+_hash_pool: ProcessPoolExecutor | None = None
+
+
+def hash_pool() -> ProcessPoolExecutor:
+    # pbkdf2 is CPU bound, so hashing runs in worker processes instead of API threads
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=settings.IMPORT_HASH_WORKERS or None)
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+def _chunks(path: str):
+    # Stream the CSV from disk; only IMPORT_CHUNK_SIZE rows are held in memory at a time
+    with open(path, encoding="utf-8", errors="ignore", newline="") as f:
+        rows = enumerate(csv.DictReader(f), start=1)
+        while True:
+            chunk = list(islice(rows, settings.IMPORT_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield chunk
+
+
+def import_geofences(job: Job, path: str) -> None:
+    created = []
+    try:
+        for chunk in _chunks(path):
+            parsed = []
+            for i, row in chunk:
+                try:
+                    name = row.get("name")
+                    risk = (row.get("risk_level") or "low").lower()
+                    # coords as JSON string: [[lng,lat], ... ]
+                    coords_str = row.get("coordinates")
+                    if not name or not coords_str:
+                        raise ValueError("missing name/coordinates")
+                    poly = repair(Polygon(json.loads(coords_str)))
+                    parsed.append((name, models.GeofenceRisk(risk), poly))
+                except Exception as e:
+                    job.add_error(i, str(e))
+            job.processed += len(chunk)
+            if not parsed:
+                continue
+            with SessionLocal() as db:
+                ids = db.scalars(
+                    insert(models.Geofence).returning(models.Geofence.id, sort_by_parameter_order=True),
+                    [{"name": n, "risk_level": r, "area": f"SRID=4326;{p.wkt}", "active": True} for n, r, p in parsed],
+                ).all()
+                write_pieces(db, ids)
+                version = bump_version(db)
+                db.commit()
+            geofence_index.apply(version, upserted=[
+                IndexedGeofence(gid, n, r, True, p) for gid, (n, r, p) in zip(ids, parsed)
+            ])
+            job.created += len(ids)
+            created += ids
+    finally:
+        os.unlink(path)
+    # One history backfill for everything imported
+    follow_up = backfill.submit(created)
+    if follow_up is not None:
+        job.related.append(follow_up.id)
+
+
+def import_users(job: Job, path: str) -> None:
+    try:
+        for chunk in _chunks(path):
+            parsed = {}
+            for i, row in chunk:
+                try:
+                    email = row.get("email")
+                    password = row.get("password")
+                    role = row.get("role") or "tourist"
+                    if not email or not password:
+                        raise ValueError("missing email/password")
+                    if email in parsed:
+                        job.skipped += 1
+                        continue
+                    parsed[email] = (password, models.Role(role))
+                except Exception as e:
+                    job.add_error(i, str(e))
+            job.processed += len(chunk)
+            if not parsed:
+                continue
+            with SessionLocal() as db:
+                # One existence query per chunk instead of one per row
+                existing = set(db.scalars(select(models.User.email).where(models.User.email.in_(list(parsed)))))
+                todo = [(e, pw, r) for e, (pw, r) in parsed.items() if e not in existing]
+                job.skipped += len(existing)
+                if not todo:
+                    continue
+                workers = settings.IMPORT_HASH_WORKERS or os.cpu_count() or 1
+                hashes = hash_pool().map(hash_password, [pw for _, pw, _ in todo], chunksize=max(1, len(todo) // (workers * 4)))
+                rows = [{"email": e, "password_hash": h, "role": r} for (e, _, r), h in zip(todo, hashes)]
+                # Rows registered concurrently since the prefetch are skipped rather than failing the chunk
+                created = db.scalars(
+                    pg_insert(models.User).on_conflict_do_nothing(index_elements=["email"]).returning(models.User.id),
+                    rows,
+                ).all()
+                db.commit()
+            job.created += len(created)
+            job.skipped += len(rows) - len(created)
+    finally:
+        os.unlink(path)
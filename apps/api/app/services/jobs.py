@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from ..core.config import settings
+
+log = logging.getLogger(__name__)
+
+MAX_ERRORS = 1000
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    total: int | None = None  # units of work when known up front (processed counts towards it)
+    processed: int = 0
+    created: int = 0
+    skipped: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+    error: str | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    # Set by JobRegistry.cancel(); long-running job functions check it between units of work
+    cancel_requested: bool = False
+    # Ids of follow-up jobs this one started (e.g. the backfill after a geofence import)
+    related: list = field(default_factory=list)
+    # Temp files the job owns (e.g. a spooled upload), removed however the job ends
+    files: list = field(default_factory=list)
+
+    def add_error(self, row: int, message: str) -> None:
+        # Keep the first MAX_ERRORS row errors so a bad file can't grow the job without bound
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "created": self.created,
+            "skipped": self.skipped,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "cancel_requested": self.cancel_requested,
+            "related_jobs": self.related,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Job":
+        # Snapshot of a job published by another worker
+        return cls(
+            id=d["job_id"],
+            kind=d["kind"],
+            status=d["status"],
+            total=d["total"],
+            processed=d["processed"],
+            created=d["created"],
+            skipped=d["skipped"],
+            error_count=d["error_count"],
+            errors=d["errors"],
+            error=d["error"],
+            started_at=datetime.fromisoformat(d["started_at"]) if d["started_at"] else None,
+            finished_at=datetime.fromisoformat(d["finished_at"]) if d["finished_at"] else None,
+            cancel_requested=d["cancel_requested"],
+            related=d["related_jobs"],
+        )
+
+
+class RedisJobStore:
+    """Job snapshots shared by every worker, so a poll or cancel may reach any of them.
+
+    The worker running a job publishes its progress every JOB_SYNC_SECONDS; a cancel from another
+    worker is a flag the owner picks up on its next sync.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        import redis
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def save(self, jobs: list[Job]) -> None:
+        with self.redis.pipeline(transaction=False) as pipe:
+            for job in jobs:
+                pipe.set(self._key(job.id), json.dumps(job.as_dict()), ex=self.ttl)
+            pipe.execute()
+
+    def load(self, job_id: str) -> Job | None:
+        raw = self.redis.get(self._key(job_id))
+        return Job.from_dict(json.loads(raw)) if raw else None
+
+    def request_cancel(self, job_id: str) -> None:
+        self.redis.set(f"{self._key(job_id)}:cancel", "1", ex=self.ttl)
+
+    def cancels(self, job_ids: list[str]) -> list[str]:
+        flags = self.redis.mget([f"{self._key(j)}:cancel" for j in job_ids])
+        return [j for j, flag in zip(job_ids, flags) if flag]
+
+
+class JobRegistry:
+    """Background jobs with pollable progress; only the most recent max_jobs are kept in process.
+
+    Without a store, jobs are visible only to the worker that runs them, so polls must reach
+    that worker; with one (JOB_BACKEND=redis), any worker can report on or cancel any job.
+    """
+
+    def __init__(self, max_jobs: int = 200, workers: int = 2, store: RedisJobStore | None = None, sync_interval: float = 1.0):
+        self.max_jobs = max_jobs
+        self.store = store
+        self.sync_interval = sync_interval
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._stop = threading.Event()
+        self._syncer: threading.Thread | None = None
+
+    def get(self, job_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def submit(self, kind: str, fn, *args, files=()) -> Job:
+        job = Job(id=uuid.uuid4().hex, kind=kind, files=list(files))
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        if self.store is not None:
+            self.store.save([job])
+            self._start_syncer()
+        self._executor.submit(self._run, job, fn, *args)
+        return job
+
+    def cancel(self, job_id: str) -> Job | None:
+        # Cooperative: a queued job never starts, a running one stops at its next check
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            # Running on another worker: leave a flag for its next sync
+            job = self.store.load(job_id)
+            if job is not None and job.status in ("queued", "running"):
+                self.store.request_cancel(job_id)
+                job.cancel_requested = True
+            return job
+        if job is not None and job.status in ("queued", "running"):
+            job.cancel_requested = True
+        return job
+
+    def _run(self, job: Job, fn, *args) -> None:
+        job.started_at = datetime.utcnow()
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = job.started_at
+            _remove_files(job)
+            self._publish([job])
+            return
+        job.status = "running"
+        try:
+            fn(job, *args)
+            job.status = "cancelled" if job.cancel_requested else "done"
+        except Exception as e:
+            log.exception("job %s (%s) failed", job.id, job.kind)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            _remove_files(job)
+            self._publish([job])
+
+    def _publish(self, jobs: list[Job]) -> None:
+        if self.store is None or not jobs:
+            return
+        try:
+            self.store.save(jobs)
+        except Exception:
+            log.exception("could not publish job progress")
+
+    def _start_syncer(self) -> None:
+        with self._lock:
+            if self._syncer is not None:
+                return
+            self._stop.clear()
+            self._syncer = threading.Thread(target=self._sync, name="job-sync", daemon=True)
+            self._syncer.start()
+
+    def _sync(self) -> None:
+        # Publish progress of this worker's unfinished jobs and pick up cancels sent to other workers
+        while not self._stop.wait(self.sync_interval):
+            active = [j for j in list(self._jobs.values()) if j.status in ("queued", "running")]
+            if not active:
+                continue
+            try:
+                waiting = {j.id: j for j in active if not j.cancel_requested}
+                for job_id in self.store.cancels(list(waiting)) if waiting else []:
+                    waiting[job_id].cancel_requested = True
+            except Exception:
+                log.exception("could not read job cancel requests")
+            self._publish(active)
+
+    def shutdown(self) -> None:
+        # Ask running jobs to stop at their next check rather than die mid-transaction
+        for job in list(self._jobs.values()):
+            if job.status == "running":
+                job.cancel_requested = True
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # Queued jobs will never run now
+        for job in list(self._jobs.values()):
+            if job.status == "queued":
+                job.status = "cancelled"
+                _remove_files(job)
+
+
+def _remove_files(job: Job) -> None:
+    while job.files:
+        path = job.files.pop()
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _store():
+    if settings.JOB_BACKEND == "redis":
+        return RedisJobStore(settings.REDIS_URL, settings.JOB_TTL_SECONDS)
+    return None
+
+
+jobs = JobRegistry(store=_store(), sync_interval=settings.JOB_SYNC_SECONDS)
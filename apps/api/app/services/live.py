@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from ..core.config import settings
+
+
+@dataclass(frozen=True)
+class Event:
+    id: str
+    seq: int
+    type: str
+    data: dict
+    payload: str  # JSON, serialised once at publish time for every subscriber
+
+
+@dataclass(frozen=True)
+class StreamFilter:
+    risk: str | None = None
+    status: str | None = None
+    bbox: tuple[float, float, float, float] | None = None  # min_lng, min_lat, max_lng, max_lat
+
+    def matches(self, ev: Event) -> bool:
+        d = ev.data
+        if "id" not in d:
+            # Aggregate events (e.g. bulk updates) carry no single alert to filter on
+            return True
+        if self.risk and d.get("risk") != self.risk:
+            return False
+        if self.status and d.get("status") != self.status:
+            return False
+        if self.bbox:
+            lng, lat = d.get("lng"), d.get("lat")
+            if lng is None or lat is None:
+                return False
+            min_lng, min_lat, max_lng, max_lat = self.bbox
+            if not (min_lng <= lng <= max_lng and min_lat <= lat <= max_lat):
+                return False
+        return True
+
+
+class Subscription:
+    """Per-client bounded buffer; when the client falls behind the oldest events are dropped, never the publisher."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, flt: StreamFilter, maxsize: int):
+        self.loop = loop
+        self.filter = flt
+        self.buffer: deque[Event] = deque(maxlen=maxsize)
+        self.lagged = False
+        self._wakeup = asyncio.Event()
+
+    def offer(self, ev: Event) -> None:
+        # May run on any thread (sync routes publish from the threadpool)
+        if not self.filter.matches(ev):
+            return
+        if len(self.buffer) == self.buffer.maxlen:
+            self.lagged = True
+        self.buffer.append(ev)
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed; the subscription is going away
+
+    async def next(self, timeout: float) -> tuple[list[Event], bool]:
+        if not self.buffer:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        events = []
+        while self.buffer:
+            events.append(self.buffer.popleft())
+        lagged, self.lagged = self.lagged, False
+        return events, lagged
+
+
+class AlertBroker:
+    """In-process pub/sub for alert changes with a replay window for reconnecting clients.
+
+    Event ids are "<epoch>-<seq>". The epoch changes with every process, so a client resuming
+    against another worker or after a restart is told to reset and refetch instead of
+    silently missing events.
+    """
+
+    def __init__(self, history: int, client_buffer: int):
+        self.epoch = format(int(time.time() * 1000), "x")
+        self.client_buffer = client_buffer
+        self._seq = itertools.count(1)
+        self._history: deque[Event] = deque(maxlen=history)
+        self._subs: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, type: str, data: dict) -> None:
+        with self._lock:
+            seq = next(self._seq)
+            ev = Event(f"{self.epoch}-{seq}", seq, type, data, json.dumps(data, default=str))
+            self._history.append(ev)
+            subs = list(self._subs)
+        for sub in subs:
+            sub.offer(ev)
+
+    def subscribe(self, flt: StreamFilter, last_id: str | None = None) -> tuple[Subscription, bool]:
+        # Returns the subscription and whether the client must reset (its last id can't be replayed)
+        sub = Subscription(asyncio.get_running_loop(), flt, self.client_buffer)
+        reset = False
+        with self._lock:
+            if last_id:
+                epoch, _, seq = last_id.partition("-")
+                first = self._history[0].seq if self._history else None
+                if epoch != self.epoch or not seq.isdigit() or (first is not None and int(seq) < first - 1):
+                    reset = True
+                else:
+                    for ev in self._history:
+                        if ev.seq > int(seq):
+                            sub.offer(ev)
+            self._subs.add(sub)
+        return sub, reset
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+
+def alert_event(alert, risk=None, lng=None, lat=None) -> dict:
+    return {
+        "id": alert.id,
+        "type": alert.type.value if hasattr(alert.type, "value") else alert.type,
+        "user_id": alert.user_id,
+        "geofence_id": alert.geofence_id,
+        "severity": alert.severity,
+        "status": alert.status.value if hasattr(alert.status, "value") else alert.status,
+        "ts": alert.ts.isoformat() if getattr(alert, "ts", None) else None,
+        "risk": risk.value if hasattr(risk, "value") else risk,
+        "lng": lng,
+        "lat": lat,
+    }
+
+
+broker = AlertBroker(settings.LIVE_HISTORY_SIZE, settings.LIVE_CLIENT_BUFFER)
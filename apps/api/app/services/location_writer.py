@@ -0,0 +1,121 @@
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from .. import models
+from ..db import engine
+from ..core.config import settings
+
+log = logging.getLogger(__name__)
+
+
+class WriterFull(Exception):
+    pass
+
+
+class LocationWriter:
+    """Write-behind buffer for Location rows, drained by a background thread in executemany batches."""
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float, enqueue_timeout: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="location-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        # Drain everything still queued before returning
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._drain()
+
+    def put(self, row: dict) -> None:
+        # Backpressure: block the request thread for up to enqueue_timeout, then give up
+        try:
+            self._queue.put(row, timeout=self.enqueue_timeout)
+        except queue.Full:
+            raise WriterFull()
+
+    def offer(self, row: dict) -> bool:
+        # Non-blocking put for the event loop; False when the queue is full
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            return False
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self) -> list[dict]:
+        # Wait for the first row, then keep taking rows until the batch is full or the interval is up
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self) -> None:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch: list[dict], attempts: int = 3) -> None:
+        for attempt in range(1, attempts + 1):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(models.Location.__table__), batch)
+                return
+            except Exception:
+                if attempt == attempts:
+                    log.exception("dropping %d buffered locations after %d attempts", len(batch), attempts)
+                    return
+                time.sleep(0.5 * attempt)
+
+
+location_writer = LocationWriter(
+    maxsize=settings.LOCATION_QUEUE_SIZE,
+    batch_size=settings.LOCATION_BATCH_SIZE,
+    flush_interval=settings.LOCATION_FLUSH_INTERVAL_MS / 1000,
+    enqueue_timeout=settings.LOCATION_ENQUEUE_TIMEOUT_MS / 1000,
+)
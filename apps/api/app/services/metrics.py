@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from ..core.config import settings
+
+log = logging.getLogger(__name__)
+slow_log = logging.getLogger("app.slow_query")
+
+# Latency buckets (seconds) shared by request and query histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus text format; one lock-protected list per label set."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += 1
+            s[-1] += value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        for labels, s in series:
+            cum = 0
+            for le, n in zip(self.buckets + ("+Inf",), s[:-1]):
+                cum += n
+                out.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {s[-1]}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cum}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        out += [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+        return out
+
+
+class GaugeFunc:
+    # Sampled at scrape time, e.g. pool size; one callback per label set
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._fns: dict[tuple, object] = {}
+
+    def set_function(self, fn, labels: tuple = ()) -> None:
+        self._fns[labels] = fn
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, fn in list(self._fns.items()):
+            try:
+                out.append(f"{self.name}{_labels(self.labelnames, labels)} {fn()}")
+            except Exception:
+                pass
+        return out
+
+
+REGISTRY: list = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for m in REGISTRY:
+        lines += m.render()
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_LATENCY = register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template, method and status",
+    ("method", "route", "status"),
+))
+DB_QUERY_LATENCY = register(Histogram("db_query_duration_seconds", "SQL statement latency by route", ("route",)))
+DB_QUERIES_PER_REQUEST = register(Histogram(
+    "db_queries_per_request", "SQL statements executed per request", ("route",), QUERY_COUNT_BUCKETS,
+))
+DB_SLOW_QUERIES = register(Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("route",)))
+POOL_CHECKOUT_WAIT = register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",),
+))
+
+POOL_SIZE = register(GaugeFunc("db_pool_size", "Configured pool size", ("engine",)))
+POOL_CHECKED_OUT = register(GaugeFunc("db_pool_checked_out", "Connections currently checked out", ("engine",)))
+POOL_OVERFLOW = register(GaugeFunc("db_pool_overflow", "Connections open beyond pool_size", ("engine",)))
+POOL_CHECKED_IN = register(GaugeFunc("db_pool_checked_in", "Idle connections in the pool", ("engine",)))
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_time")
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+
+    @property
+    def route(self) -> str:
+        # Route template ("/alerts/{alert_id}/resolve"), known once routing has happened
+        route = self.scope.get("route") if self.scope is not None else None
+        return getattr(route, "path", None) or "unmatched"
+
+
+# Set per request by MetricsMiddleware; sync routes and streaming bodies run in the threadpool
+# with a copy of the context, so they update the same object
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_route() -> str:
+    stats = _current.get()
+    return stats.route if stats is not None else "background"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware) timing each request until its last body chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = stats.route
+            REQUEST_LATENCY.observe(time.perf_counter() - start, (scope["method"], route, str(status)))
+            DB_QUERIES_PER_REQUEST.observe(stats.queries, (route,))
+
+
+def instrument_engine(engine, name: str = "sync") -> None:
+    # For an AsyncEngine pass engine.sync_engine; events and pool are shared with it
+    slow_after = settings.SLOW_QUERY_MS / 1000
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current.get()
+        route = stats.route if stats is not None else "background"
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        DB_QUERY_LATENCY.observe(elapsed, (route,))
+        if slow_after and elapsed >= slow_after:
+            DB_SLOW_QUERIES.inc((route,))
+            slow_log.warning("slow query %.1fms route=%s: %s", elapsed * 1000, route, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        # The after hook doesn't run for failed statements; keep the timing stack balanced
+        starts = ctx.connection.info.get("query_start") if ctx.connection is not None else None
+        if starts:
+            starts.pop()
+
+    pool = engine.pool
+    POOL_SIZE.set_function(pool.size, (name,))
+    POOL_CHECKED_OUT.set_function(pool.checkedout, (name,))
+    POOL_OVERFLOW.set_function(pool.overflow, (name,))
+    POOL_CHECKED_IN.set_function(pool.checkedin, (name,))
@@ -0,0 +1,154 @@
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from ..core.config import settings
+
+
+@dataclass
+class Stay:
+    entered_at: datetime
+    alert_id: int | None = None  # breach alert raised on entry, annotated on exit
+
+
+# user_id -> {geofence_id: Stay}
+Zones = dict[int, Stay]
+
+
+class MemoryOccupancy:
+    """Per-process LRU of user occupancy; an evicted user is simply re-warmed from the database."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, Zones] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get_many(self, user_ids) -> dict[int, Zones | None]:
+        out = {}
+        with self._lock:
+            for uid in user_ids:
+                zones = self._data.get(uid)
+                if zones is not None:
+                    self._data.move_to_end(uid)
+                    zones = {gid: Stay(s.entered_at, s.alert_id) for gid, s in zones.items()}
+                out[uid] = zones
+        return out
+
+    async def set_many(self, states: dict[int, Zones]) -> None:
+        with self._lock:
+            for uid, zones in states.items():
+                self._data[uid] = dict(zones)
+                self._data.move_to_end(uid)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class RedisOccupancy:
+    """Occupancy shared by every worker: one hash per user, geofence_id -> [entered_at, alert_id].
+
+    A "_" field marks a user as known even when they are in no zone, so "outside everything"
+    is not confused with "never seen" (which triggers a database warm-up).
+    """
+
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(uid: int) -> str:
+        return f"occupancy:{uid}"
+
+    async def get_many(self, user_ids) -> dict[int, Zones | None]:
+        uids = list(user_ids)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for uid in uids:
+                pipe.hgetall(self._key(uid))
+            raw = await pipe.execute()
+        out = {}
+        for uid, h in zip(uids, raw):
+            if not h:
+                out[uid] = None
+                continue
+            zones = {}
+            for field, value in h.items():
+                if field == "_":
+                    continue
+                entered_at, alert_id = json.loads(value)
+                zones[int(field)] = Stay(datetime.fromisoformat(entered_at), alert_id)
+            out[uid] = zones
+        return out
+
+    async def set_many(self, states: dict[int, Zones]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for uid, zones in states.items():
+                key = self._key(uid)
+                mapping = {"_": "1"}
+                mapping.update({str(gid): json.dumps([s.entered_at.isoformat(), s.alert_id]) for gid, s in zones.items()})
+                pipe.delete(key)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+
+async def _warm(db: AsyncSession, user_ids: list[int]) -> dict[int, Zones]:
+    # After a restart or eviction: zones whose entry alert is still open and has no recorded exit.
+    # Served by the partial ix_alerts_open_breach index.
+    rows = (await db.execute(
+        select(models.Alert.user_id, models.Alert.geofence_id, models.Alert.id, models.Alert.ts, models.Alert.details)
+        .where(
+            models.Alert.user_id.in_(user_ids),
+            models.Alert.type == models.AlertType.geofence_breach,
+            models.Alert.status != models.AlertStatus.resolved,
+        )
+        .order_by(models.Alert.ts)
+    )).all()
+    out: dict[int, Zones] = {uid: {} for uid in user_ids}
+    for uid, gid, aid, ts, details in rows:
+        if gid is None:
+            continue
+        if details and details.get("exited_at"):
+            out[uid].pop(gid, None)
+        else:
+            out[uid][gid] = Stay(ts, aid)
+    return out
+
+
+class OccupancyTracker:
+    def __init__(self, store):
+        self.store = store
+
+    async def load(self, db: AsyncSession, user_ids) -> dict[int, Zones]:
+        # Private copies: callers mutate them and save() only after their transaction commits
+        states = await self.store.get_many(set(user_ids))
+        missing = [uid for uid, zones in states.items() if zones is None]
+        if missing:
+            warmed = await _warm(db, missing)
+            # Cache what the database says right away, so a ping that changes nothing (the common
+            # case) doesn't re-run the warm-up query next time. Copies: the caller mutates its own.
+            await self.store.set_many({
+                uid: {gid: Stay(s.entered_at, s.alert_id) for gid, s in zones.items()}
+                for uid, zones in warmed.items()
+            })
+            states.update(warmed)
+        return states
+
+    async def save(self, states: dict[int, Zones]) -> None:
+        if states:
+            await self.store.set_many(states)
+
+
+def _store():
+    if settings.OCCUPANCY_BACKEND == "redis":
+        return RedisOccupancy(settings.REDIS_URL, settings.OCCUPANCY_TTL_SECONDS)
+    return MemoryOccupancy(settings.OCCUPANCY_CACHE_SIZE)
+
+
+occupancy = OccupancyTracker(_store())
@@ -0,0 +1,242 @@
+import logging
+import re
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from .. import models
+from ..db import engine
+from ..core.config import settings
+
+log = logging.getLogger(__name__)
+
+TABLE = "locations"
+# Arbitrary key for the advisory lock that keeps maintenance to one worker at a time
+MAINTENANCE_LOCK = 7_314_001
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+ROLLUP_SQL = text(
+    """
+    INSERT INTO location_tracks (user_id, day, path, points, started_at, ended_at)
+    SELECT user_id, day,
+           CASE WHEN n = 1 THEN ST_MakeLine(first, first) ELSE ST_Simplify(path, :tolerance) END,
+           n, started_at, ended_at
+    FROM (
+        SELECT user_id,
+               date_trunc('day', ts) AS day,
+               ST_MakeLine(position ORDER BY ts) AS path,
+               (array_agg(position ORDER BY ts))[1] AS first,
+               count(*) AS n,
+               min(ts) AS started_at,
+               max(ts) AS ended_at
+        FROM locations
+        WHERE ts >= :start AND ts < :end AND user_id IS NOT NULL
+        GROUP BY user_id, date_trunc('day', ts)
+    ) d
+    ON CONFLICT (user_id, day) DO NOTHING
+    """
+)
+
+
+def period_start(ts: datetime, interval: str) -> datetime:
+    day = datetime(ts.year, ts.month, ts.day)
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def period_step(interval: str) -> timedelta:
+    return timedelta(weeks=1) if interval == "week" else timedelta(days=1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{TABLE}_p{start:%Y%m%d}"
+
+
+def is_partitioned(conn) -> bool:
+    kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": TABLE}).scalar()
+    return kind == "p"
+
+
+def list_partitions(conn) -> list[tuple[str, datetime, datetime]]:
+    # (name, from, to) of every bounded partition, oldest first; the default partition is skipped
+    rows = conn.execute(text(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t)
+        """
+    ), {"t": TABLE}).all()
+    out = []
+    for name, bound in rows:
+        m = _BOUND.search(bound or "")
+        if m:
+            out.append((name, datetime.fromisoformat(m.group(1)), datetime.fromisoformat(m.group(2))))
+    return sorted(out, key=lambda p: p[1])
+
+
+def ensure_partitions(conn, now: datetime | None = None, since: datetime | None = None) -> None:
+    """Create the default partition and partitions from the current period through LOCATION_PARTITIONS_AHEAD more.
+
+    Pings are routed to a small, hot partition, so insert cost doesn't grow with history.
+    Rows outside every range (clock skew, backfills) land in the default partition.
+    since also covers older periods, for history about to be copied in.
+    """
+    interval = settings.LOCATION_PARTITION_INTERVAL
+    step = period_step(interval)
+    start = period_start(now or datetime.utcnow(), interval)
+    end = start + (settings.LOCATION_PARTITIONS_AHEAD + 1) * step
+    if since is not None:
+        start = min(start, period_start(since, interval))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+    existing = list_partitions(conn)
+    for lo in (start + i * step for i in range((end - start) // step)):
+        hi = lo + step
+        if any(p_lo < hi and lo < p_hi for _, p_lo, p_hi in existing):
+            continue
+        try:
+            with conn.begin_nested():
+                _create_partition(conn, lo, hi)
+        except Exception:
+            log.exception("could not create location partition for %s", lo)
+
+
+def _create_partition(conn, lo: datetime, hi: datetime) -> None:
+    bound = f"FOR VALUES FROM ('{lo.isoformat(sep=' ')}') TO ('{hi.isoformat(sep=' ')}')"
+    default = f"{TABLE}_default"
+    window = {"lo": lo, "hi": hi}
+    stranded = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE ts >= :lo AND ts < :hi)"), window).scalar()
+    if not stranded:
+        conn.execute(text(f"CREATE TABLE {partition_name(lo)} PARTITION OF {TABLE} {bound}"))
+        return
+    # Rows for this range already sit in the default partition (e.g. maintenance was down over a
+    # period boundary), which blocks the new partition: detach the default, create the partition,
+    # move the rows into it and reattach. Inserts wait on the parent's lock meanwhile.
+    columns = ", ".join(c.name for c in models.Location.__table__.columns)
+    conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {default}"))
+    conn.execute(text(f"CREATE TABLE {partition_name(lo)} PARTITION OF {TABLE} {bound}"))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE ts >= :lo AND ts < :hi RETURNING {columns}) "
+        f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM moved"
+    ), window).rowcount
+    conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {default} DEFAULT"))
+    log.info("moved %d pings from %s into new partition %s", moved, default, partition_name(lo))
+
+
+def convert_to_partitioned(conn) -> str | None:
+    """Replace a locations table created before partitioning with a partitioned one holding the same rows.
+
+    The old table is renamed (with its indexes and id sequence) to locations_unpartitioned and
+    kept for the operator to drop; returns that name, or None if locations is already partitioned.
+    Runs in the caller's transaction, so ingest waits on the table lock until it commits.
+    """
+    if is_partitioned(conn):
+        return None
+    conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": MAINTENANCE_LOCK})
+    old = f"{TABLE}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+    # Free the index and sequence names for the new table
+    for (ix,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": old}).all():
+        conn.execute(text(f'ALTER INDEX "{ix}" RENAME TO "{ix}_unpartitioned"'))
+    seq = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": old}).scalar()
+    if seq:
+        conn.execute(text(f"ALTER SEQUENCE {seq} RENAME TO {TABLE}_id_seq_unpartitioned"))
+    models.Location.__table__.create(bind=conn)
+    # One partition per period of history, so retention can drop it instead of DELETE-ing
+    first = conn.execute(text(f"SELECT min(ts) FROM {old}")).scalar()
+    ensure_partitions(conn, since=first)
+    columns = ", ".join(c.name for c in models.Location.__table__.columns)
+    copied = conn.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {old}")).rowcount
+    conn.execute(text(f"SELECT setval(pg_get_serial_sequence(:t, 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {TABLE}), false)"), {"t": TABLE})
+    log.info("copied %d pings from %s into partitioned %s", copied, old, TABLE)
+    return old
+
+
+def rollup(conn, start: datetime, end: datetime) -> int:
+    # Downsample raw pings in [start, end) into one simplified track per user per day
+    return conn.execute(ROLLUP_SQL, {"start": start, "end": end, "tolerance": settings.LOCATION_TRACK_TOLERANCE}).rowcount
+
+
+def apply_retention(conn, now: datetime | None = None) -> None:
+    """Roll up and drop raw pings older than LOCATION_RAW_RETENTION_DAYS, and expire old tracks."""
+    now = now or datetime.utcnow()
+    raw_cutoff = period_start(now - timedelta(days=settings.LOCATION_RAW_RETENTION_DAYS), "day")
+    if is_partitioned(conn):
+        # Whole partitions only, so the drop is a catalog operation instead of a huge DELETE
+        for name, lo, hi in list_partitions(conn):
+            if hi > raw_cutoff:
+                break
+            tracks = rollup(conn, lo, hi)
+            conn.execute(text(f"DROP TABLE {name}"))
+            log.info("rolled up %s into %d tracks and dropped it", name, tracks)
+    # Whatever is still older than the cutoff sits in the default partition, or in a table
+    # created before partitioning; roll it up and DELETE it
+    first = conn.execute(text(f"SELECT min(ts) FROM {TABLE}")).scalar()
+    if first is not None and first < raw_cutoff:
+        rollup(conn, period_start(first, "day"), raw_cutoff)
+        conn.execute(text(f"DELETE FROM {TABLE} WHERE ts < :cutoff"), {"cutoff": raw_cutoff})
+    track_cutoff = now - timedelta(days=30 * settings.LOCATION_TRACK_RETENTION_MONTHS)
+    conn.execute(text("DELETE FROM location_tracks WHERE day < :cutoff"), {"cutoff": track_cutoff})
+
+
+def run_maintenance(now: datetime | None = None) -> bool:
+    # Returns False when another worker holds the maintenance lock
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": MAINTENANCE_LOCK}).scalar():
+            return False
+        if is_partitioned(conn):
+            ensure_partitions(conn, now)
+        apply_retention(conn, now)
+    return True
+
+
+def prepare() -> None:
+    # Startup: make sure the current and upcoming partitions exist before the first insert
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            log.warning("%s is not partitioned (created before partitioning); retention will use DELETE", TABLE)
+            return
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": MAINTENANCE_LOCK})
+        ensure_partitions(conn)
+
+
+class PartitionMaintainer:
+    """Background thread running partition maintenance every interval seconds.
+
+    The first pass (prepare) runs in the thread too, so startup doesn't wait on partition DDL;
+    inserts that arrive before it land in the default partition.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="partition-maintainer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        try:
+            prepare()
+        except Exception:
+            log.exception("location partition preparation failed")
+        while not self._stop.wait(self.interval):
+            try:
+                run_maintenance()
+            except Exception:
+                log.exception("location partition maintenance failed")
+
+
+partition_maintainer = PartitionMaintainer(settings.LOCATION_MAINTENANCE_INTERVAL_SECONDS)
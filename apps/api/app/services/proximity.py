@@ -0,0 +1,74 @@
+import math
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.config import settings
+from .geofence_index import METRES_PER_DEGREE, geofence_index
+
+RISK_ORDER = [models.GeofenceRisk.low, models.GeofenceRisk.medium, models.GeofenceRisk.high]
+
+# Planar KNN (<->) on the geofences GiST index picks candidates inside a bbox prefilter,
+# then geography distance gives exact metres. Candidates are over-fetched because planar
+# degree order can differ slightly from true distance order.
+NEARBY_SQL = text(
+    """
+    SELECT id, name, risk_level, distance_m FROM (
+        SELECT g.id, g.name, g.risk_level, ST_Distance(g.area::geography, p.geom::geography) AS distance_m
+        FROM geofences g, (SELECT ST_SetSRID(ST_Point(:lng, :lat), 4326) AS geom) p
+        WHERE g.active
+          AND g.risk_level::text IN :risks
+          AND g.area && ST_Expand(p.geom, :deg)
+          AND ST_DWithin(g.area::geography, p.geom::geography, :radius)
+        ORDER BY g.area <-> p.geom
+        LIMIT :candidates
+    ) c
+    ORDER BY distance_m, id
+    LIMIT :limit
+    """
+).bindparams(bindparam("risks", expanding=True))
+
+
+def risks_from(min_risk: models.GeofenceRisk) -> set[models.GeofenceRisk]:
+    return set(RISK_ORDER[RISK_ORDER.index(models.GeofenceRisk(min_risk)):])
+
+
+def nearby(db: Session, lng: float, lat: float, radius_m: float, limit: int, risks: set) -> list[dict]:
+    """Active geofences within radius_m of the point, nearest first, as dicts with distance_m.
+
+    Served from the in-process index when it is enabled (no database round trip, suitable per
+    ping), otherwise by one PostGIS query.
+    """
+    if settings.GEOFENCE_INDEX_ENABLED:
+        geofence_index.ensure_fresh(db)
+        return _from_index(lng, lat, radius_m, limit, risks)
+    return _from_db(db, lng, lat, radius_m, limit, risks)
+
+
+async def nearby_async(db: AsyncSession, lng: float, lat: float, radius_m: float, limit: int, risks: set) -> list[dict]:
+    # nearby() for async routes: an index reload runs in a worker thread, the query on the async session
+    if settings.GEOFENCE_INDEX_ENABLED:
+        await geofence_index.ensure_fresh_async(db)
+        return _from_index(lng, lat, radius_m, limit, risks)
+    return await db.run_sync(_from_db, lng, lat, radius_m, limit, risks)
+
+
+def _from_index(lng: float, lat: float, radius_m: float, limit: int, risks: set) -> list[dict]:
+    return [
+        {"id": e.id, "name": e.name, "risk_level": e.risk_level, "distance_m": round(d, 1)}
+        for e, d in geofence_index.nearby(lng, lat, radius_m, limit, risks)
+    ]
+
+
+def _from_db(db: Session, lng: float, lat: float, radius_m: float, limit: int, risks: set) -> list[dict]:
+    deg = radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    rows = db.execute(NEARBY_SQL, {
+        "lng": lng, "lat": lat, "radius": radius_m, "deg": deg, "limit": limit, "candidates": limit * 4,
+        "risks": [r.value for r in risks],
+    }).all()
+    return [
+        {"id": r.id, "name": r.name, "risk_level": models.GeofenceRisk(r.risk_level), "distance_m": round(r.distance_m, 1)}
+        for r in rows
+    ]
@@ -0,0 +1,181 @@
+import hashlib
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from ..core.config import settings
+from .geofence_index import geofence_index
+
+MAX_ZOOM = 22
+MAX_LAT = 85.0511287798
+
+
+def tile_range(bounds: tuple, z: int) -> tuple[int, int, int, int]:
+    # Tiles covering a lon/lat bbox at zoom z, widened by one tile for the MVT geometry buffer
+    minx, miny, maxx, maxy = bounds
+    n = 2 ** z
+
+    def tx(lon):
+        return int((lon + 180.0) / 360.0 * n)
+
+    def ty(lat):
+        lat = math.radians(min(max(lat, -MAX_LAT), MAX_LAT))
+        return int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+
+    return (
+        max(tx(minx) - 1, 0), max(ty(maxy) - 1, 0),
+        min(tx(maxx) + 1, n - 1), min(ty(miny) + 1, n - 1),
+    )
+
+
+class TileCache:
+    """Bounded LRU of encoded vector tiles, optionally backed by a directory shared by workers on one host."""
+
+    def __init__(self, maxsize: int, directory: str | None = None):
+        self.maxsize = maxsize
+        self.directory = directory or None
+        self._mem: OrderedDict[tuple, tuple[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = -1
+        self._disk_checked = False
+        # Bumped by every invalidation; a tile rendered before one is not stored
+        self.generation = 0
+
+    def get(self, key: tuple) -> tuple[str, bytes] | None:
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                self._mem.move_to_end(key)
+                return item
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                return None
+            item = (_etag(data), data)
+            self._put(key, item)
+            return item
+        return None
+
+    def set(self, key: tuple, data: bytes, generation: int) -> tuple[str, bytes]:
+        item = (_etag(data), data)
+        if generation != self.generation:
+            return item
+        self._put(key, item)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return item
+
+    def invalidate(self, bounds=None) -> None:
+        self.generation += 1
+        if bounds is None:
+            with self._lock:
+                self._mem.clear()
+            if self.directory:
+                self._reset_disk()
+            return
+        for b in bounds:
+            ranges = {z: tile_range(b, z) for z in range(MAX_ZOOM + 1)}
+            with self._lock:
+                for key in [k for k in self._mem if _in_range(k, ranges)]:
+                    del self._mem[key]
+            if self.directory:
+                self._invalidate_disk(ranges)
+        if self.directory:
+            self._write_marker()
+
+    def check_version(self, version: int) -> None:
+        # Used when there is no geofence index to report changes: drop everything on a version change
+        if version != self._version:
+            self._version = version
+            self.invalidate()
+
+    def _current_version(self) -> int:
+        return geofence_index.version if settings.GEOFENCE_INDEX_ENABLED else self._version
+
+    def _marker(self) -> str:
+        return os.path.join(self.directory, "VERSION")
+
+    def _write_marker(self) -> None:
+        # Geofence version the tiles on disk were rendered for
+        version = self._current_version()
+        if version < 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._marker()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(version))
+        os.replace(tmp, self._marker())
+
+    def _reset_disk(self) -> None:
+        # The first full invalidation in a process is the initial index load (or version check):
+        # keep the shared directory when its tiles were rendered for the version just loaded, so
+        # the disk cache survives restarts; otherwise, and on every later full reload, wipe it
+        version = self._current_version()
+        if not self._disk_checked:
+            self._disk_checked = True
+            try:
+                with open(self._marker()) as f:
+                    if version >= 0 and int(f.read().strip()) == version:
+                        return
+            except (OSError, ValueError):
+                pass
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+        self._write_marker()
+
+    def _put(self, key: tuple, item: tuple[str, bytes]) -> None:
+        with self._lock:
+            self._mem[key] = item
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.maxsize:
+                self._mem.popitem(last=False)
+
+    def _path(self, key: tuple) -> str:
+        layer, z, x, y = key
+        return os.path.join(self.directory, layer, str(z), str(x), f"{y}.pbf")
+
+    def _invalidate_disk(self, ranges: dict) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        for layer in os.listdir(self.directory):
+            for z, (x0, y0, x1, y1) in ranges.items():
+                zdir = os.path.join(self.directory, layer, str(z))
+                if not os.path.isdir(zdir):
+                    continue
+                # Walk only the tiles that exist on disk instead of every tile in the range
+                for xs in os.listdir(zdir):
+                    if not xs.isdigit() or not x0 <= int(xs) <= x1:
+                        continue
+                    for name in os.listdir(os.path.join(zdir, xs)):
+                        ys = name.split(".", 1)[0]
+                        if ys.isdigit() and y0 <= int(ys) <= y1:
+                            try:
+                                os.remove(os.path.join(zdir, xs, name))
+                            except OSError:
+                                pass
+
+
+def _in_range(key: tuple, ranges: dict) -> bool:
+    _, z, x, y = key
+    x0, y0, x1, y1 = ranges[z]
+    return x0 <= x <= x1 and y0 <= y <= y1
+
+
+def _etag(data: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+tile_cache = TileCache(settings.TILE_CACHE_SIZE, settings.TILE_CACHE_DIR)
+geofence_index.add_listener(tile_cache.invalidate)
@@ -0,0 +1,75 @@
+import importlib
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Where boot time goes: import time per router module, startup phases, and time to first request.
+
+    Times are relative to when the app package was first imported. For a full per-module import
+    breakdown run `python -X importtime -c "import app.main"`.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.imports: dict[str, float] = {}
+        self.phases: dict[str, float] = {}
+        self.ready_at: float | None = None
+        self.first_request_at: float | None = None
+
+    def import_module(self, name: str):
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = time.perf_counter() - start
+        return module
+
+    def phase(self, name: str):
+        return _Phase(self, name)
+
+    def ready(self) -> None:
+        self.ready_at = time.perf_counter() - self.t0
+        log.info(
+            "startup ready in %.0fms (imports %s; phases %s)",
+            self.ready_at * 1000,
+            ", ".join(f"{k.rsplit('.', 1)[-1]}={v * 1000:.0f}ms" for k, v in self.imports.items()),
+            ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.phases.items()) or "none",
+        )
+
+    def as_dict(self) -> dict:
+        ms = lambda v: round(v * 1000, 1) if v is not None else None
+        return {
+            "imports_ms": {k: ms(v) for k, v in self.imports.items()},
+            "phases_ms": {k: ms(v) for k, v in self.phases.items()},
+            "ready_ms": ms(self.ready_at),
+            "first_request_ms": ms(self.first_request_at),
+        }
+
+
+class _Phase:
+    def __init__(self, report: StartupReport, name: str):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.report.phases[self.name] = time.perf_counter() - self.start
+
+
+class FirstRequestTimer:
+    # Pure ASGI pass-through that records when the first HTTP request completes
+    def __init__(self, app, report: StartupReport):
+        self.app = app
+        self.report = report
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if self.report.first_request_at is None and scope["type"] == "http":
+            self.report.first_request_at = time.perf_counter() - self.report.t0
+            log.info("first request served %.0fms after startup began", self.report.first_request_at * 1000)
+
+
+report = StartupReport()
@@ -0,0 +1,53 @@
+"""Per-request cost of the get_current_user dependency.
+
+Compares a cold principal cache (JWT decode + user lookup on every request, the old
+behaviour), a warm cache, and a token carrying the role claim. Run from apps/api against
+a database that contains the user:
+
+    DATABASE_URL=postgresql+psycopg://... python -m bench.auth_overhead --user-id 1 -n 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.deps import get_current_user, principal_cache
+from app.security import create_access_token
+
+
+async def _run(token: str, n: int, cold: bool) -> list[float]:
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    await get_current_user(creds)
+    samples = []
+    for _ in range(n):
+        if cold:
+            principal_cache.clear()
+        t0 = time.perf_counter()
+        await get_current_user(creds)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return samples
+
+
+def _report(name: str, samples: list[float]) -> None:
+    q = statistics.quantiles(samples, n=100)
+    print(f"{name:<12} mean={statistics.fmean(samples):8.1f}us p50={q[49]:8.1f}us p95={q[94]:8.1f}us p99={q[98]:8.1f}us")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--user-id", type=int, required=True)
+    ap.add_argument("--role", default="admin", help="role placed in the role-claim token")
+    ap.add_argument("-n", type=int, default=2000)
+    args = ap.parse_args()
+
+    plain = create_access_token(str(args.user_id))
+    claimed = create_access_token(str(args.user_id), role=args.role)
+    _report("cold", asyncio.run(_run(plain, args.n, cold=True)))
+    _report("warm", asyncio.run(_run(plain, args.n, cold=False)))
+    _report("role-claim", asyncio.run(_run(claimed, args.n, cold=True)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Compare two bench.load result files scenario by scenario.
+
+    python -m bench.compare bench/results/before.json bench/results/after.json
+
+Latency deltas are negative when the second run is faster; throughput deltas are positive.
+Exits non-zero when any p95 regresses by more than --fail-over percent (for CI).
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms", "errors")
+
+
+def _pct(old: float, new: float) -> str:
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("before")
+    ap.add_argument("after")
+    ap.add_argument("--fail-over", type=float, default=None, help="fail if any p95 grows by more than this percent")
+    args = ap.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"before: {before.get('commit')}  after: {after.get('commit')}")
+    if before.get("dataset") != after.get("dataset"):
+        print("warning: runs used different datasets")
+
+    regressed = []
+    for name in sorted(set(before["results"]) & set(after["results"])):
+        b, a = before["results"][name], after["results"][name]
+        cols = "  ".join(f"{m}={a.get(m, 0)} ({_pct(b.get(m, 0), a.get(m, 0)).strip()})" for m in METRICS)
+        print(f"{name:<10} {cols}")
+        if args.fail_over is not None and b.get("p95_ms") and a.get("p95_ms", 0) > b["p95_ms"] * (1 + args.fail_over / 100):
+            regressed.append(name)
+    if regressed:
+        print(f"p95 regression over {args.fail_over}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
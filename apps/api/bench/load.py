@@ -0,0 +1,175 @@
+"""Async load driver for the API hot paths.
+
+Runs each scenario for a fixed duration with C concurrent clients against a running API
+seeded by bench.seed, and writes p50/p95/p99 latency and throughput per scenario as JSON
+(compare two runs with bench.compare). Needs httpx (pip install -r bench/requirements.txt).
+Run from apps/api with the API's JWT_SECRET so the driver can mint tokens:
+
+    JWT_SECRET=... python -m bench.load --base-url http://localhost:8000 -c 32 -d 20 --out bench/results/$(git rev-parse --short HEAD).json
+
+Scenarios: ingest (POST /locations/ingest), alerts (GET /alerts/), geojson
+(GET /geofences/geojson), heatmap (GET /analytics/heatmap over the seeded bbox and history), auth_cold / auth_warm (an authenticated GET with a fresh token per
+request vs one reused token; the difference is the cost of the auth dependency).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app.security import create_access_token
+
+SCENARIOS = ("ingest", "alerts", "geojson", "heatmap", "auth_cold", "auth_warm")
+
+
+class Scenario:
+    def __init__(self, manifest: dict, rng: random.Random):
+        self.m = manifest
+        self.rng = rng
+        self.user_tokens = {uid: create_access_token(str(uid)) for uid in manifest["user_ids"][:1000]}
+        self.admin_token = create_access_token(str(manifest["admin_id"]))
+        # Far-future window: the authenticated request itself does almost no work
+        self.future = (datetime.now(timezone.utc) + timedelta(days=3650)).isoformat()
+        self.history_start = (datetime.now(timezone.utc) - timedelta(days=manifest["days"])).isoformat()
+        self._fresh = 0
+
+    def _auth(self, token: str) -> dict:
+        return {"Authorization": f"Bearer {token}"}
+
+    def request(self, name: str) -> tuple[str, str, dict]:
+        # (method, url, httpx kwargs)
+        if name == "ingest":
+            uid = self.rng.choice(list(self.user_tokens))
+            min_lng, min_lat, max_lng, max_lat = self.m["bbox"]
+            body = {
+                "user_id": uid,
+                "lng": self.rng.uniform(min_lng, max_lng),
+                "lat": self.rng.uniform(min_lat, max_lat),
+                "speed": self.rng.randint(0, 20),
+                "source": "mobile",
+            }
+            return "POST", "/locations/ingest", {"json": body, "headers": self._auth(self.user_tokens[uid])}
+        if name == "alerts":
+            return "GET", "/alerts/", {"params": {"limit": 50}}
+        if name == "geojson":
+            return "GET", "/geofences/geojson", {}
+        if name == "heatmap":
+            params = {"bbox": ",".join(str(v) for v in self.m["bbox"]), "from": self.history_start}
+            return "GET", "/analytics/heatmap", {"params": params, "headers": self._auth(self.admin_token)}
+        params = {"since": self.future}
+        if name == "auth_cold":
+            # A distinct expiry gives a distinct token, so the principal cache never hits
+            self._fresh += 1
+            token = create_access_token(str(self.m["admin_id"]), expires_minutes=60 + self._fresh)
+            return "GET", "/alerts/export", {"params": params, "headers": self._auth(token)}
+        return "GET", "/alerts/export", {"params": params, "headers": self._auth(self.admin_token)}
+
+
+async def _worker(client: httpx.AsyncClient, scenario: Scenario, name: str, deadline: float, samples: list, errors: list) -> None:
+    while time.perf_counter() < deadline:
+        method, url, kwargs = scenario.request(name)
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kwargs)
+            await r.aread()
+            ok = r.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        samples.append(time.perf_counter() - t0)
+        if not ok:
+            errors.append(1)
+
+
+async def run_scenario(base_url: str, scenario: Scenario, name: str, concurrency: int, duration: float, warmup: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        if warmup > 0:
+            await asyncio.gather(*(
+                _worker(client, scenario, name, time.perf_counter() + warmup, [], []) for _ in range(concurrency)
+            ))
+        samples: list[float] = []
+        errors: list[int] = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _worker(client, scenario, name, start + duration, samples, errors) for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    return summarise(samples, len(errors), elapsed)
+
+
+def summarise(samples: list[float], errors: int, elapsed: float) -> dict:
+    if len(samples) < 2:
+        return {"requests": len(samples), "errors": errors, "rps": len(samples) / elapsed if elapsed else 0.0}
+    ms = [s * 1000 for s in samples]
+    q = statistics.quantiles(ms, n=100)
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(q[49], 3),
+        "p95_ms": round(q[94], 3),
+        "p99_ms": round(q[98], 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--base-url", default="http://localhost:8000")
+    ap.add_argument("--manifest", default="bench/manifest.json")
+    ap.add_argument("-c", "--concurrency", type=int, default=16)
+    ap.add_argument("-d", "--duration", type=float, default=15.0, help="seconds per scenario")
+    ap.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each scenario")
+    ap.add_argument("-s", "--scenario", action="append", choices=SCENARIOS, help="repeatable; default all")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    scenario = Scenario(manifest, random.Random(args.seed))
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = r = asyncio.run(
+            run_scenario(args.base_url, scenario, name, args.concurrency, args.duration, args.warmup)
+        )
+        print(
+            f"{name:<10} {r['rps']:>9.1f} req/s  p50={r.get('p50_ms', 0):8.2f}ms p95={r.get('p95_ms', 0):8.2f}ms "
+            f"p99={r.get('p99_ms', 0):8.2f}ms errors={r['errors']}"
+        )
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "dataset": {k: v for k, v in manifest.items() if k != "user_ids"},
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
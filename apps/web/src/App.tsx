@@ -163,15 +163,28 @@ export default function App() {
     }
   }
 
-  // Poll alerts and geofences periodically
+  // Poll geofences periodically (cheap: unchanged layers come back as 304)
   useEffect(() => {
     const t = setInterval(() => {
-      refreshAlerts()
       refreshGeofences()
     }, 5000)
     return () => clearInterval(t)
   }, [])
 
+  // Alerts are pushed by the server; refetch the current page whenever something changes
+  // (the stream needs a token; EventSource can't send headers, so it goes in the query string).
+  // Without a token, fall back to polling every 5s as before.
+  useEffect(() => {
+    if (!apiToken) {
+      const t = setInterval(() => { refreshAlerts() }, 5000)
+      return () => clearInterval(t)
+    }
+    const es = new EventSource(`${API_URL}/alerts/stream?access_token=${encodeURIComponent(apiToken)}`)
+    const onChange = () => { refreshAlerts() }
+    for (const ev of ['alert.created', 'alert.updated', 'alert.bulk_updated', 'alert.bulk_created', 'reset', 'lagged']) es.addEventListener(ev, onChange)
+    return () => es.close()
+  }, [apiToken])
+
   const refreshGeofences = async () => {
     try {
       const res = await fetch(`${API_URL}/geofences/geojson`)